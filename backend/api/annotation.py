@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class AnnotationMatrix:
+    def __init__(self, labels, capacity=1024):
+        self.labels = list(labels)
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+        self.label_rank = np.argsort(np.argsort(self.labels))
+        self.counts = np.zeros(len(self.labels), dtype=np.int64)
+        self.matrix = np.zeros((capacity, len(self.labels)), dtype=bool)
+        self.rows = {}
+        self.free_rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, label):
+        return label in self.label_index
+
+    def get_unknown(self, annotation):
+        return [label for label in annotation if label not in self.label_index]
+
+    def encode(self, annotation):
+        row = np.zeros(len(self.labels), dtype=bool)
+        row[[self.label_index[label] for label in annotation]] = True
+        return row
+
+    def _allocate_row(self, key):
+        row = self.rows.get(key)
+        if row is not None:
+            return row
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            row = len(self.rows)
+            if row == len(self.matrix):
+                self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+        self.rows[key] = row
+        return row
+
+    def load(self, annotations):
+        row_indices = []
+        label_indices = []
+        for key, annotation in annotations.items():
+            row = self._allocate_row(key)
+            self.matrix[row] = False
+            row_indices.extend([row] * len(annotation))
+            label_indices.extend(self.label_index[label] for label in annotation)
+        self.matrix[row_indices, label_indices] = True
+
+    def set(self, key, annotation):
+        new_row = self.encode(annotation)
+        row = self.rows.get(key)
+        if row is not None:
+            self.counts -= self.matrix[row]
+        self.counts += new_row
+        if new_row.any():
+            row = self._allocate_row(key)
+            self.matrix[row] = new_row
+        else:
+            self.discard(key)
+
+    def discard(self, key):
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.matrix[row] = False
+            self.free_rows.append(row)
+
+    def get(self, keys):
+        return self.matrix[[self.rows[key] for key in keys]]
+
+    def add_counts(self, count_dict):
+        for label, count in count_dict.items():
+            if label in self.label_index:
+                self.counts[self.label_index[label]] += count
+
+    def get_top(self, n_top, mask=None):
+        is_selected = self.counts > 0
+        if mask is not None:
+            is_selected &= mask
+        indices = np.flatnonzero(is_selected)
+        indices = indices[np.lexsort((self.label_rank[indices], -self.counts[indices]))]
+        return [self.labels[i] for i in indices[:n_top]]
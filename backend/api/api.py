@@ -1,5 +1,6 @@
 import logging
 
+from flask import request
 from watchdog.observers import Observer
 
 from .handler import EcgDirectoryHandler
@@ -10,8 +11,10 @@ def create_namespace(server_config):
     logger = logging.getLogger("server." + __name__)
 
     logger.info("Creating annotation namespace")
-    namespace = AnnotationNamespace("/api", is_shutdown_enabled=server_config.pop("is_shutdown_enabled"))
-    handler = EcgDirectoryHandler(**server_config, ignore_directories=True)
+    namespace = AnnotationNamespace("/api", is_shutdown_enabled=server_config.pop("is_shutdown_enabled"),
+                                    n_request_workers=server_config.pop("n_request_workers"),
+                                    request_queue_size=server_config.pop("request_queue_size"))
+    handler = EcgDirectoryHandler(**server_config, metrics=namespace.metrics, ignore_directories=True)
     namespace.handler = handler
     handler.namespace = namespace
     logger.info("Namespace created")
@@ -29,25 +32,55 @@ class AnnotationNamespace(BaseNamespace):
         super().__init__(*args, **kwargs)
         self.is_shutdown_enabled = is_shutdown_enabled
 
+    def on_connect(self):
+        super().on_connect()
+        data = {"isReady": self.handler.ready_event.is_set()}
+        self.notify("SERVER_READY", data, room=request.sid)
+
     def on_ECG_GET_ANNOTATION_LIST(self, data, meta):
         self._safe_call(self.handler._get_annotation_list, data, meta, "ECG_GET_ANNOTATION_LIST",
-                        "ECG_GOT_ANNOTATION_LIST")
+                        "ECG_GOT_ANNOTATION_LIST", is_offloaded=True)
 
     def on_ECG_GET_COMMON_ANNOTATION_LIST(self, data, meta):
         self._safe_call(self.handler._get_common_annotation_list, data, meta, "ECG_GET_COMMON_ANNOTATION_LIST",
-                        "ECG_GOT_COMMON_ANNOTATION_LIST")
+                        "ECG_GOT_COMMON_ANNOTATION_LIST", is_offloaded=True)
 
     def on_ECG_GET_LIST(self, data, meta):
-        self._safe_call(self.handler._get_ecg_list, data, meta, "ECG_GET_LIST", "ECG_GOT_LIST")
+        if data and ("offset" in data or "limit" in data):
+            self._safe_call(self.handler._get_ecg_list_page, data, meta, "ECG_GET_LIST", "ECG_GOT_LIST_PAGE",
+                            is_offloaded=True)
+        else:
+            self._safe_call(self.handler._get_ecg_list, data, meta, "ECG_GET_LIST", "ECG_GOT_LIST", is_offloaded=True)
+
+    def on_ECG_QUERY(self, data, meta):
+        self._safe_call(self.handler._query_ecg_list, data, meta, "ECG_QUERY", "ECG_GOT_QUERY", is_offloaded=True)
+
+    def on_ECG_GET_NEXT_UNANNOTATED(self, data, meta):
+        self._safe_call(self.handler._get_next_unannotated, data, meta, "ECG_GET_NEXT_UNANNOTATED",
+                        "ECG_GOT_NEXT_UNANNOTATED", is_offloaded=True)
 
     def on_ECG_GET_ITEM_DATA(self, data, meta):
-        self._safe_call(self.handler._get_item_data, data, meta, "ECG_GET_ITEM_DATA", "ECG_GOT_ITEM_DATA")
+        self._safe_call(self.handler._get_item_data, data, meta, "ECG_GET_ITEM_DATA", "ECG_GOT_ITEM_DATA",
+                        is_offloaded=True, is_cancellable=True, event_cancelled="ECG_ITEM_DATA_CANCELLED")
+
+    def on_ECG_GET_ITEM_WINDOW(self, data, meta):
+        self._safe_call(self.handler._get_item_window, data, meta, "ECG_GET_ITEM_WINDOW", "ECG_GOT_ITEM_WINDOW",
+                        is_offloaded=True, is_cancellable=True)
 
     def on_ECG_SET_ANNOTATION(self, data, meta):
-        self._safe_call(self.handler._set_annotation, data, meta, "ECG_SET_ANNOTATION")
+        self._safe_call(self.handler._set_annotation, data, meta, "ECG_SET_ANNOTATION", is_offloaded=True)
+
+    def on_ECG_EXPORT_ANNOTATION(self, data, meta):
+        self._safe_call(self.handler._export_annotation, data, meta, "ECG_EXPORT_ANNOTATION", is_offloaded=True)
 
     def on_ECG_DUMP_SIGNALS(self, data, meta):
-        self._safe_call(self.handler._dump_signals, data, meta, "ECG_DUMP_SIGNALS")
+        self._safe_call(self.handler._dump_signals, data, meta, "ECG_DUMP_SIGNALS", is_offloaded=True)
+
+    def on_ECG_EXPORT_DATASET(self, data, meta):
+        self._safe_call(self.handler._export_dataset, data, meta, "ECG_EXPORT_DATASET", is_offloaded=True)
+
+    def on_ECG_GET_METRICS(self, data, meta):
+        self._safe_call(self._get_metrics, data, meta, "ECG_GET_METRICS", "ECG_GOT_METRICS")
 
     def on_SHUTDOWN(self, data, meta):
         if self.is_shutdown_enabled and self.n_connected == 1:
@@ -1,30 +1,154 @@
+import time
+import queue
+import socket
 import logging
+import threading
+from itertools import count
 
-from flask import request
+from flask import has_request_context, request
 from flask_socketio import Namespace
 
+from .metrics import Metrics, get_binary_size
+from .workers import WorkerPool, WorkerPoolFullError
+
+
+def get_wait_read(async_mode):
+    if async_mode == "eventlet":
+        from eventlet.hubs import trampoline
+        return lambda fileno: trampoline(fileno, read=True)
+    from gevent.socket import wait_read
+    return wait_read
+
 
 class BaseNamespace(Namespace):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, n_request_workers, request_queue_size, **kwargs):
         super().__init__(*args, **kwargs)
         self.n_connected = 0
+        self.metrics = Metrics()
         self.logger = logging.getLogger("server." + __name__)
+        self.n_request_workers = n_request_workers
+        self.request_queue_size = request_queue_size
+        self.worker_pool = None
+        self.request_ids = count(1)
+        self.request_lock = threading.Lock()
+        self.latest_requests = {}
+        self.loop_thread_id = None
+        self.emit_queue = None
+        self.emit_reader = None
+        self.emit_writer = None
+
+    def _set_socketio(self, socketio):
+        super()._set_socketio(socketio)
+        on_change = lambda n_pending: self.metrics.set_gauge("pending_requests", n_pending)
+        self.worker_pool = WorkerPool(self.n_request_workers, self.request_queue_size, socketio.async_mode,
+                                      on_change=on_change)
+        info_str = "Request worker pool created in {} mode with {} workers and {} queue slots"
+        self.logger.info(info_str.format(socketio.async_mode, self.n_request_workers, self.request_queue_size))
+        if socketio.async_mode in ("eventlet", "gevent"):
+            self.loop_thread_id = threading.get_ident()
+            self.emit_queue = queue.Queue()
+            self.emit_reader, self.emit_writer = socket.socketpair()
+            self.emit_reader.setblocking(False)
+            self.emit_writer.setblocking(False)
+            socketio.start_background_task(self._relay_emits, get_wait_read(socketio.async_mode))
+
+    def emit(self, event, data=None, room=None, **kwargs):
+        if self.socketio is None:
+            self.logger.warning("Event {} is dropped because the namespace is not registered yet".format(event))
+            return
+        if self.emit_queue is not None and threading.get_ident() != self.loop_thread_id:
+            self.emit_queue.put((event, data, room, kwargs))
+            try:
+                self.emit_writer.send(b"\0")
+            except BlockingIOError:
+                pass
+            return
+        super().emit(event, data, room=room, **kwargs)
+
+    def _relay_emits(self, wait_read):
+        while True:
+            wait_read(self.emit_reader.fileno())
+            try:
+                while self.emit_reader.recv(4096):
+                    pass
+            except BlockingIOError:
+                pass
+            while True:
+                try:
+                    event, data, room, kwargs = self.emit_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    super().emit(event, data, room=room, **kwargs)
+                except Exception as error:
+                    self.logger.exception(error)
 
     def on_connect(self):
         self.logger.info("User connected {}".format(request.sid))
         self.n_connected += 1
+        self.metrics.set_gauge("connected_clients", self.n_connected)
 
     def on_disconnect(self):
         self.logger.info("User disconnected {}".format(request.sid))
         self.n_connected -= 1
+        self.metrics.set_gauge("connected_clients", self.n_connected)
+        with self.request_lock:
+            self.latest_requests.pop(request.sid, None)
 
-    def _safe_call(self, method, data, meta, event_in, event_out=None):
-        self.logger.info("Handling event {}. Data: {}. Meta: {}.".format(event_in, data, meta))
+    def notify(self, event_out, data, meta=None, room=None):
+        self.emit(event_out, dict(data=data, meta=meta if meta is not None else {}), room=room)
+        self.logger.info("Sending notification {}".format(event_out))
+
+    def _start_request(self, sid, event):
+        request_id = next(self.request_ids)
+        with self.request_lock:
+            self.latest_requests.setdefault(sid, {})[event] = request_id
+        return request_id
+
+    def _is_superseded(self, sid, event, request_id):
+        with self.request_lock:
+            return self.latest_requests.get(sid, {}).get(event) != request_id
+
+    def _run_request(self, method, data, meta, sid, event, request_id):
+        if request_id is not None and self._is_superseded(sid, event, request_id):
+            return None
+        return method(data, meta)
+
+    def _safe_call(self, method, data, meta, event_in, event_out=None, is_offloaded=False, is_cancellable=False,
+                   event_cancelled=None):
+        self.logger.info("Handling event {}".format(event_in))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Event {} data: {}. Meta: {}.".format(event_in, data, meta))
+        start_time = time.perf_counter()
+        sid = request.sid if has_request_context() else None
+        request_id = self._start_request(sid, event_in) if is_cancellable and sid is not None else None
         try:
-            payload = method(data, meta)
-            if event_out is not None:
-                self.emit(event_out, payload)
+            if is_offloaded and sid is not None and self.worker_pool is not None:
+                payload = self.worker_pool.run(self._run_request, method, data, meta, sid, event_in, request_id)
+            else:
+                payload = self._run_request(method, data, meta, sid, event_in, request_id)
+            if request_id is not None and self._is_superseded(sid, event_in, request_id):
+                self.metrics.count("cancelled_requests")
+                self.logger.info("Event {} is superseded by a newer request of {}".format(event_in, sid))
+                if event_cancelled is not None:
+                    self.notify(event_cancelled, {"id": data.get("id")}, meta, room=sid)
+            elif event_out is not None:
+                binary_size = get_binary_size(payload)
+                if binary_size:
+                    self.metrics.observe_payload_size(event_out, "out_binary", binary_size)
+                self.emit(event_out, payload, room=sid)
                 self.logger.info("Sending response {}. Meta: {}".format(event_out, meta))
+        except WorkerPoolFullError as error:
+            self.metrics.count("rejected_requests")
+            self.emit("ERROR", str(error), room=sid)
+            self.logger.warning("Event {} is rejected: {}".format(event_in, error))
+            if event_cancelled is not None:
+                self.notify(event_cancelled, {"id": data.get("id")}, meta, room=sid)
         except Exception as error:
-            self.emit("ERROR", str(error))
+            self.metrics.count_error(event_in)
+            self.emit("ERROR", str(error), room=sid)
             self.logger.exception(error)
+        self.metrics.observe_latency(event_in, time.perf_counter() - start_time)
+
+    def _get_metrics(self, data, meta):
+        return dict(data=self.metrics.get_stats(), meta=meta)
@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from .loader import create_signal_data
+
+
+def get_size(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, list) and obj and isinstance(obj[0], float):
+        return sys.getsizeof(obj) + len(obj) * sys.getsizeof(obj[0])
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(get_size(item) for item in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(get_size(item) for item in obj.values())
+    return sys.getsizeof(obj)
+
+
+class SignalCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.data = OrderedDict()
+        self.logger = logging.getLogger("server." + __name__)
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key][0]
+
+    def put(self, key, value):
+        size = get_size(value)
+        with self.lock:
+            if key in self.data:
+                self.size -= self.data.pop(key)[1]
+            if size > self.max_size:
+                self.logger.debug("Item {} of {} bytes exceeds the cache size and will not be cached".format(key, size))
+                return
+            self.data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                evicted_key, (_, evicted_size) = self.data.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+                self.logger.debug("Item {} is evicted from the cache".format(evicted_key))
+
+    def pop(self, key):
+        with self.lock:
+            if key in self.data:
+                self.size -= self.data.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.size = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "size": self.size,
+                "max_size": self.max_size,
+                "n_items": len(self.data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class SignalDiskCache:
+    MANIFEST_NAME = "manifest.json"
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+    def __init__(self, cache_dir, version):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.manifest_path = os.path.join(cache_dir, self.MANIFEST_NAME)
+        self.entries = {}
+        self.sha_files = defaultdict(set)
+        self.is_dirty = False
+        self.logger = logging.getLogger("server." + __name__)
+        self.lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_manifest()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _get_signal_path(self, sha):
+        return os.path.join(self.cache_dir, sha + ".npy")
+
+    def _load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            self.logger.debug("There is no signal cache manifest")
+            return
+        try:
+            with open(self.manifest_path, encoding="utf-8") as json_data:
+                manifest = json.load(json_data)
+        except ValueError:
+            self.logger.warning("Signal cache manifest is corrupted")
+            manifest = {}
+        if manifest.get("version") != self.version:
+            info_str = "Signal cache version {} does not match loader version {}, the cache is invalidated"
+            self.logger.info(info_str.format(manifest.get("version"), self.version))
+            self._clear()
+            return
+        for file_name, entry in manifest["entries"].items():
+            self.entries[file_name] = entry
+            self.sha_files[entry["sha"]].add(file_name)
+        self.logger.debug("Signal cache manifest with {} entries is loaded".format(len(self.entries)))
+
+    def _clear(self):
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith((".npy", ".tmp")) or file_name == self.MANIFEST_NAME:
+                os.remove(os.path.join(self.cache_dir, file_name))
+        self.entries = {}
+        self.sha_files = defaultdict(set)
+        self.is_dirty = True
+
+    def _encode_meta(self, signal_data):
+        return {
+            "fs": signal_data.fs,
+            "units": list(signal_data.units),
+            "signame": list(signal_data.signame),
+            "timestamp": signal_data.timestamp.strftime(self.TIMESTAMP_FORMAT),
+        }
+
+    def _decode_meta(self, meta):
+        meta = dict(meta)
+        meta["timestamp"] = datetime.strptime(meta["timestamp"], self.TIMESTAMP_FORMAT)
+        return meta
+
+    def get(self, path, keep_signal=True):
+        file_name = os.path.basename(path)
+        with self.lock:
+            entry = self.entries.get(file_name)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            return None
+        if keep_signal:
+            signal = self.load_signal(entry["sha"])
+            if signal is None:
+                return None
+        elif os.path.isfile(self._get_signal_path(entry["sha"])):
+            signal = None
+        else:
+            return None
+        signal_data = create_signal_data(file_name, entry["mtime"], signal, self._decode_meta(entry["meta"]))
+        return entry["sha"], signal_data
+
+    def load_signal(self, sha, mmap_mode=None):
+        try:
+            return np.load(self._get_signal_path(sha), mmap_mode=mmap_mode)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, path, sha, signal_data):
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            self.logger.debug("File {} disappeared and will not be cached".format(path))
+            return
+        entry = {
+            "size": size,
+            "mtime": signal_data.modification_time,
+            "sha": sha,
+            "meta": self._encode_meta(signal_data),
+        }
+        signal_path = self._get_signal_path(sha)
+        with self.lock:
+            self.remove(signal_data.file_name)
+            if not os.path.isfile(signal_path):
+                tmp_path = signal_path + ".tmp"
+                with open(tmp_path, "wb") as signal_file:
+                    np.save(signal_file, signal_data.signal)
+                os.replace(tmp_path, signal_path)
+            self.entries[signal_data.file_name] = entry
+            self.sha_files[sha].add(signal_data.file_name)
+            self.is_dirty = True
+
+    def remove(self, file_name):
+        with self.lock:
+            entry = self.entries.pop(file_name, None)
+            if entry is None:
+                return
+            self.is_dirty = True
+            sha_files = self.sha_files[entry["sha"]]
+            sha_files.discard(file_name)
+            if not sha_files:
+                del self.sha_files[entry["sha"]]
+                signal_path = self._get_signal_path(entry["sha"])
+                if os.path.isfile(signal_path):
+                    os.remove(signal_path)
+
+    def rename(self, src, dst):
+        with self.lock:
+            entry = self.entries.pop(src, None)
+            if entry is None:
+                return
+            self.entries[dst] = entry
+            self.sha_files[entry["sha"]].discard(src)
+            self.sha_files[entry["sha"]].add(dst)
+            self.is_dirty = True
+
+    def retain(self, file_names):
+        with self.lock:
+            for file_name in set(self.entries) - set(file_names):
+                self.remove(file_name)
+
+    def save(self):
+        with self.lock:
+            if not self.is_dirty:
+                return
+            manifest = {"version": self.version, "entries": self.entries}
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as json_data:
+                json.dump(manifest, json_data)
+            os.replace(tmp_path, self.manifest_path)
+            self.is_dirty = False
+        self.logger.debug("Signal cache manifest with {} entries is saved".format(len(self.entries)))
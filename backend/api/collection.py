@@ -0,0 +1,212 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+
+from .record import intern_tuple
+
+
+class EcgCollection:
+    def __init__(self):
+        self.records = OrderedDict()
+        self.file_names = {}
+        self.order = []
+        self.annotated_order = []
+        self.unannotated_order = []
+        self.label_order = defaultdict(list)
+        self.label_shas = defaultdict(set)
+        self.changes = OrderedDict()
+
+    @staticmethod
+    def _get_order_key(sha, record):
+        return record.timestamp, sha
+
+    @staticmethod
+    def _remove_key(order, key):
+        del order[bisect_left(order, key)]
+
+    def _index(self, sha, record):
+        key = self._get_order_key(sha, record)
+        insort(self.order, key)
+        if record.annotation:
+            insort(self.annotated_order, key)
+        else:
+            insort(self.unannotated_order, key)
+        for label in set(record.annotation):
+            insort(self.label_order[label], key)
+            self.label_shas[label].add(sha)
+
+    def _unindex(self, sha, record):
+        key = self._get_order_key(sha, record)
+        self._remove_key(self.order, key)
+        if record.annotation:
+            self._remove_key(self.annotated_order, key)
+        else:
+            self._remove_key(self.unannotated_order, key)
+        for label in set(record.annotation):
+            label_order = self.label_order[label]
+            self._remove_key(label_order, key)
+            self.label_shas[label].discard(sha)
+            if not label_order:
+                del self.label_order[label]
+                del self.label_shas[label]
+
+    def _reindex(self):
+        self.order = sorted(self._get_order_key(sha, record) for sha, record in self.records.items())
+        self.annotated_order = []
+        self.unannotated_order = []
+        self.label_order = defaultdict(list)
+        self.label_shas = defaultdict(set)
+        for key in self.order:
+            sha = key[1]
+            annotation = self.records[sha].annotation
+            if annotation:
+                self.annotated_order.append(key)
+            else:
+                self.unannotated_order.append(key)
+            for label in set(annotation):
+                self.label_order[label].append(key)
+                self.label_shas[label].add(sha)
+
+    @staticmethod
+    def _get_page(order, offset, limit, lower=0, upper=None):
+        upper = len(order) if upper is None else upper
+        end = max(upper - offset, lower)
+        start = lower if limit is None else max(end - limit, lower)
+        return [sha for _, sha in reversed(order[start:end])]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, sha):
+        return sha in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, sha):
+        return self.records[sha]
+
+    def get(self, sha, default=None):
+        return self.records.get(sha, default)
+
+    def keys(self):
+        return self.records.keys()
+
+    def values(self):
+        return self.records.values()
+
+    def items(self):
+        return self.records.items()
+
+    def get_sha(self, file_name):
+        return self.file_names.get(file_name)
+
+    def get_by_file_name(self, file_name):
+        sha = self.file_names.get(file_name)
+        return None if sha is None else self.records[sha]
+
+    def get_ordered(self, offset=0, limit=None):
+        return self._get_page(self.order, offset, limit)
+
+    def query(self, labels=(), is_annotated=None, start=None, end=None, offset=0, limit=None):
+        labels = set(labels)
+        if labels:
+            if is_annotated is False or not labels.issubset(self.label_order):
+                return [], 0
+            if len(labels) == 1:
+                order = self.label_order[next(iter(labels))]
+            else:
+                shas = set.intersection(*(self.label_shas[label] for label in labels))
+                order = sorted(self._get_order_key(sha, self.records[sha]) for sha in shas)
+        elif is_annotated is None:
+            order = self.order
+        else:
+            order = self.annotated_order if is_annotated else self.unannotated_order
+        lower = 0 if start is None else bisect_left(order, (start,))
+        upper = len(order) if end is None else max(bisect_left(order, (end,)), lower)
+        return self._get_page(order, offset, limit, lower, upper), upper - lower
+
+    def get_next_unannotated(self, sha=None):
+        if not self.unannotated_order:
+            return None
+        if sha is None or sha not in self.records:
+            return self.unannotated_order[-1][1]
+        position = bisect_left(self.unannotated_order, self._get_order_key(sha, self.records[sha]))
+        return self.unannotated_order[position - 1][1] if position else None
+
+    def get_neighbors(self, sha, n, is_annotated=None):
+        if is_annotated is None:
+            order = self.order
+        else:
+            order = self.annotated_order if is_annotated else self.unannotated_order
+        position = bisect_left(order, self._get_order_key(sha, self.records[sha]))
+        next_shas = [sha for _, sha in reversed(order[max(position - n, 0):position])]
+        if position < len(order) and order[position][1] == sha:
+            position += 1
+        previous_shas = [sha for _, sha in order[position:position + n]]
+        return next_shas, previous_shas
+
+    def add(self, sha, record):
+        existing_record = self.records.get(sha)
+        if existing_record is not None:
+            del self.file_names[existing_record.file_name]
+            self._unindex(sha, existing_record)
+        elif self.changes.get(sha) == "removed":
+            self.changes[sha] = "changed"
+        else:
+            self.changes[sha] = "added"
+        self.records[sha] = record
+        self.file_names[record.file_name] = sha
+        self._index(sha, record)
+
+    def remove(self, sha):
+        record = self.records.pop(sha)
+        del self.file_names[record.file_name]
+        self._unindex(sha, record)
+        if self.changes.get(sha) == "added":
+            del self.changes[sha]
+        else:
+            self.changes[sha] = "removed"
+        return record
+
+    def set_annotation(self, sha, annotation):
+        record = self.records[sha]
+        is_annotation_changed = bool(record.annotation) != bool(annotation)
+        self._unindex(sha, record)
+        record.annotation = intern_tuple(annotation)
+        self._index(sha, record)
+        if is_annotation_changed:
+            self.mark_changed(sha)
+
+    def set_annotations(self, annotations):
+        for sha, annotation in annotations.items():
+            record = self.records[sha]
+            if bool(record.annotation) != bool(annotation):
+                self.mark_changed(sha)
+            record.annotation = intern_tuple(annotation)
+        self._reindex()
+
+    def mark_changed(self, sha):
+        if sha not in self.changes:
+            self.changes[sha] = "changed"
+
+    def pop_changes(self):
+        changes = self.changes
+        self.changes = OrderedDict()
+        return changes
+
+    def remove_by_file_name(self, file_name):
+        sha = self.file_names.get(file_name)
+        if sha is None:
+            return None, None
+        return sha, self.remove(sha)
+
+    def rename(self, src, dst):
+        sha = self.file_names.pop(src, None)
+        if sha is None:
+            return None
+        dst_sha = self.file_names.get(dst)
+        if dst_sha is not None and dst_sha != sha:
+            self.remove(dst_sha)
+        self.records[sha].file_name = dst
+        self.file_names[dst] = sha
+        return sha
@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+
+import numpy as np
+
+
+DATASET_VERSION = 1
+SIGNAL_DTYPE = "<f4"
+SIGNAL_FILE = "signals.bin"
+MANIFEST_FILE = "manifest.json"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class DatasetWriter:
+    def __init__(self, path, labels):
+        self.path = path
+        self.part_path = path + ".part"
+        self.labels = list(labels)
+        self.offsets = [0]
+        self.shapes = []
+        self.label_chunks = []
+        self.columns = {"sha": [], "file_name": [], "fs": [], "signame": [], "units": [], "timestamp": []}
+        os.makedirs(self.part_path)
+        self.signal_file = open(os.path.join(self.part_path, SIGNAL_FILE), "wb")
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def write_chunk(self, shas, records, signals, labels):
+        for sha, record, signal in zip(shas, records, signals):
+            signal = np.ascontiguousarray(signal, dtype=SIGNAL_DTYPE)
+            signal.tofile(self.signal_file)
+            self.offsets.append(self.offsets[-1] + signal.size)
+            self.shapes.append(signal.shape)
+            self.columns["sha"].append(sha)
+            self.columns["file_name"].append(record.file_name)
+            self.columns["fs"].append(record.fs)
+            self.columns["signame"].append(list(record.signame))
+            self.columns["units"].append(list(record.units))
+            self.columns["timestamp"].append(record.timestamp.strftime(TIMESTAMP_FORMAT))
+        self.label_chunks.append(np.asarray(labels, dtype=bool))
+
+    def close(self):
+        self.signal_file.close()
+        labels = np.concatenate(self.label_chunks) if self.label_chunks else np.zeros((0, len(self.labels)), bool)
+        np.save(os.path.join(self.part_path, "offsets.npy"), np.array(self.offsets, dtype=np.int64))
+        np.save(os.path.join(self.part_path, "shapes.npy"), np.array(self.shapes, dtype=np.int64).reshape(-1, 2))
+        np.save(os.path.join(self.part_path, "labels.npy"), labels)
+        manifest = {
+            "version": DATASET_VERSION,
+            "n_records": len(self),
+            "signal_dtype": SIGNAL_DTYPE,
+            "signal_layout": "Each record is a C-ordered (n_leads, n_samples) block of signals.bin "
+                             "starting at offsets[i] elements",
+            "labels": self.labels,
+            "records": self.columns,
+        }
+        with open(os.path.join(self.part_path, MANIFEST_FILE), "w", encoding="utf-8") as json_data:
+            json.dump(manifest, json_data, ensure_ascii=False)
+        os.replace(self.part_path, self.path)
+
+    def abort(self):
+        self.signal_file.close()
+        shutil.rmtree(self.part_path, ignore_errors=True)
+
+
+def load_dataset(path):
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as json_data:
+        manifest = json.load(json_data)
+    if manifest["version"] != DATASET_VERSION:
+        raise ValueError("Unsupported dataset version {}".format(manifest["version"]))
+    signal_path = os.path.join(path, SIGNAL_FILE)
+    if os.path.getsize(signal_path):
+        signals = np.memmap(signal_path, dtype=manifest["signal_dtype"], mode="r")
+    else:
+        signals = np.zeros(0, dtype=manifest["signal_dtype"])
+    return {
+        "signals": signals,
+        "offsets": np.load(os.path.join(path, "offsets.npy"), mmap_mode="r"),
+        "shapes": np.load(os.path.join(path, "shapes.npy"), mmap_mode="r"),
+        "labels": np.load(os.path.join(path, "labels.npy"), mmap_mode="r"),
+        "label_names": manifest["labels"],
+        "records": manifest["records"],
+    }
+
+
+def get_signal(dataset, i):
+    start = dataset["offsets"][i]
+    return dataset["signals"][start:dataset["offsets"][i + 1]].reshape(dataset["shapes"][i])
@@ -1,31 +1,59 @@
+import io
 import os
 import re
-import stat
 import json
+import time
+import queue
 import signal
-import shutil
 import logging
+import zipfile
 import threading
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import partial
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-import pandas as pd
-from watchdog.events import FileSystemEvent, RegexMatchingEventHandler
+from watchdog.events import RegexMatchingEventHandler
 
-from .loader import load_data
+from .annotation import AnnotationMatrix
+from .cache import SignalCache, SignalDiskCache
+from .collection import EcgCollection
+from .dataset import DatasetWriter
+from .loader import get_cache_version, import_cardio, load_signal, try_load_data
+from .metrics import Metrics
+from .pyramid import build_pyramid, get_window
+from .record import freeze_signal
+from .rwlock import RWLock
+from .storage import AnnotationStore
+from .transport import SIGNAL_FORMATS, encode_signal, to_json_list
 
 
-def synchronized(method):
+def read_locked(method):
     def decorated(self, *args, **kwargs):
-        with self.lock:
+        with self.lock.read_lock():
+            return method(self, *args, **kwargs)
+    return decorated
+
+
+def write_locked(method):
+    def decorated(self, *args, **kwargs):
+        with self.lock.write_lock():
             return method(self, *args, **kwargs)
     return decorated
 
 
 class EcgDirectoryHandler(RegexMatchingEventHandler):
+    TIMESTAMP_FORMAT = "%d.%m.%Y %H:%M:%S"
+    MAX_INGEST_ATTEMPTS = 5
+    MAX_COALESCING_DELAY = 10
+    DUMP_PROGRESS_INTERVAL = 0.5
+    EXPORT_CHUNK_SIZE = 64
+    SIGNAL_LOADING_CHUNK_SIZE = 64
+
     def __init__(self, watch_dir, dump_dir, annotation_list_path, annotation_count_path, submitted_annotation_path,
-                 *args, **kwargs):
+                 annotation_db_path, is_lazy_loading_enabled, is_native_reader_enabled, signal_cache_size, n_workers,
+                 cache_dir, event_coalescing_window, prefetch_size, *args, metrics=None, **kwargs):
         self.pattern = "^.+\.xml$"
         super().__init__([self.pattern], *args, **kwargs)
         self.watch_dir = watch_dir
@@ -33,127 +61,422 @@ class EcgDirectoryHandler(RegexMatchingEventHandler):
         self.annotation_list_path = annotation_list_path
         self.annotation_count_path = annotation_count_path
         self.submitted_annotation_path = submitted_annotation_path
+        self.annotation_store = AnnotationStore(annotation_db_path)
+        self.is_lazy_loading_enabled = is_lazy_loading_enabled
+        self.is_native_reader_enabled = is_native_reader_enabled
+        self.signal_cache = SignalCache(signal_cache_size)
+        self.disk_cache = SignalDiskCache(cache_dir, get_cache_version(is_native_reader_enabled)) if cache_dir else None
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.n_workers) if self.n_workers > 1 else None
         self.logger = logging.getLogger("server." + __name__)
-        self.lock = threading.RLock()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.lock = RWLock(on_wait=self.metrics.observe_lock_wait)
 
-        self.data = OrderedDict()
+        self.data = EcgCollection()
         self.annotation_dict = {}
-        self.annotation_count_dict = OrderedDict()
+        self.annotation_matrix = None
+        self.pending_annotations = {}
+        self.list_version = 0
         self.dumped_signals = set()
+        self.dumping_signals = set()
+        self.dump_thread = None
+        self.export_thread = None
+
+        self.event_coalescing_window = event_coalescing_window
+        self.event_condition = threading.Condition()
+        self.pending_events = []
+        self.first_event_time = None
+        self.last_event_time = None
+        self.file_stats = {}
+        self.ingest_attempts = {}
+
+        self.prefetch_size = prefetch_size
+        self.prefetch_queue = queue.Queue()
+        self.prefetched_keys = set()
+        self.prefetch_lock = threading.Lock()
+
+        self.ready_event = threading.Event()
+        self.warm_up_thread = None
+        self.warm_up_time = None
 
         self.logger.info("Initial loading started")
+        start_time = time.perf_counter()
         self._load_annotation_list()
-        self._load_data()
+        self.uncached_paths = self._load_cached_data()
+        self._import_legacy_annotation()
         self._load_annotation_count()
-        self._load_submitted_annotation()
-        self.logger.info("Initial loading finished")
+        self._load_submitted_annotation(prune=not self.uncached_paths)
+        self.data.pop_changes()
+        self.startup_time = time.perf_counter() - start_time
+        info_str = "Initial loading of {} cached ECGs finished in {:.2f} seconds, {} ECGs are left to parse"
+        self.logger.info(info_str.format(len(self.data), self.startup_time, len(self.uncached_paths)))
+        self.metrics.set_gauge("startup_seconds", self.startup_time)
         self._log_data()
 
+        self.event_thread = threading.Thread(target=self._watch_events, daemon=True)
+        self.event_thread.start()
+        if self.prefetch_size:
+            self.prefetch_thread = threading.Thread(target=self._watch_prefetch_requests, daemon=True)
+            self.prefetch_thread.start()
+
     def _log_data(self):
-        file_names = [signal_data["file_name"] for sha, signal_data in self.data.items()]
-        self.logger.debug("{} ECGs are stored: {}".format(len(self.data), ", ".join(file_names)))
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        with self.lock.read_lock():
+            file_names = [signal_data.file_name for sha, signal_data in self.data.items()]
+        self.logger.debug("{} ECGs are stored: {}".format(len(file_names), ", ".join(file_names)))
 
     def _load_annotation_list(self):
         with open(self.annotation_list_path, encoding="utf-8") as json_data:
             self.annotation_dict = json.load(json_data, object_pairs_hook=OrderedDict)
         if not self.annotation_dict:
             raise ValueError("A list of possible ECG annotations can not be empty")
+        labels = []
         for group, annotations in self.annotation_dict.items():
             if not annotations:
-                self.annotation_count_dict[group] = 0
+                labels.append(group)
             else:
-                for annotation in annotations:
-                    self.annotation_count_dict[group + "/" + annotation] = 0
+                labels.extend(group + "/" + annotation for annotation in annotations)
+        self.annotation_matrix = AnnotationMatrix(labels)
         debug_str = "{} groups with {} possible annotations are loaded"
-        self.logger.debug(debug_str.format(len(self.annotation_dict), len(self.annotation_count_dict)))
+        self.logger.debug(debug_str.format(len(self.annotation_dict), len(labels)))
 
-    def _load_data(self):
-        path_gen = (os.path.join(self.watch_dir, f) for f in sorted(os.listdir(self.watch_dir))
-                    if re.match(self.pattern, f) is not None)
-        for path in path_gen:
-            self._update_data(path)
+    def _load_cached_data(self):
+        paths = [os.path.join(self.watch_dir, f) for f in sorted(os.listdir(self.watch_dir))
+                 if re.match(self.pattern, f) is not None]
+        if self.disk_cache is None:
+            return paths
+        self.disk_cache.retain(os.path.basename(path) for path in paths)
+        uncached_paths = []
+        for path in paths:
+            cached_data = self.disk_cache.get(path, keep_signal=False)
+            if cached_data is None:
+                uncached_paths.append(path)
+            else:
+                self._merge_data(path, *cached_data)
+        self._save_cache()
+        return uncached_paths
 
-    def _load_annotation_count(self):
-        if not os.path.isfile(self.annotation_count_path):
-            self.logger.debug("There is no annotation count file")
+    def start_warm_up(self):
+        self.warm_up_thread = threading.Thread(target=self._warm_up, daemon=True)
+        self.warm_up_thread.start()
+
+    def wait_ready(self, timeout=None):
+        return self.ready_event.wait(timeout)
+
+    def _warm_up(self):
+        start_time = time.perf_counter()
+        try:
+            if not self.is_native_reader_enabled:
+                import_time = import_cardio()
+                self.metrics.set_gauge("cardio_import_seconds", import_time)
+            paths, self.uncached_paths = self.uncached_paths, []
+            results = self._read_data(paths)
+            with self.lock.write_lock():
+                failed_paths = self._merge_results(paths, results)
+                if paths:
+                    self._load_submitted_annotation(prune=True)
+                patch = self._pop_list_patch()
+            self._save_cache()
+            self._retry_failed_files(paths, failed_paths)
+        except Exception as error:
+            self.logger.exception(error)
+            patch = None
+        self.warm_up_time = time.perf_counter() - start_time
+        self.metrics.set_gauge("warm_up_seconds", self.warm_up_time)
+        info_str = "Warm-up finished in {:.2f} seconds using {} workers, {} ECGs are loaded"
+        self.logger.info(info_str.format(self.warm_up_time, self.n_workers, len(self.data)))
+        self.ready_event.set()
+        self._log_data()
+        self._send_list_patch(patch)
+        self.namespace.notify("SERVER_READY", {"isReady": True})
+        if not self.is_lazy_loading_enabled:
+            self._load_signals()
+
+    def _load_signals(self):
+        start_time = time.perf_counter()
+        with self.lock.read_lock():
+            items = [(sha, signal_data) for sha, signal_data in self.data.items() if signal_data.signal is None]
+        n_loaded = 0
+        for start in range(0, len(items), self.SIGNAL_LOADING_CHUNK_SIZE):
+            payloads = []
+            for sha, signal_data in items[start:start + self.SIGNAL_LOADING_CHUNK_SIZE]:
+                try:
+                    signal = freeze_signal(self._read_signal(sha, signal_data))
+                except Exception as error:
+                    self.logger.warning("Signal {} can not be loaded: {}".format(signal_data.file_name, error))
+                else:
+                    payloads.append((signal_data, signal, build_pyramid(signal)))
+            with self.lock.write_lock():
+                for signal_data, signal, pyramid in payloads:
+                    signal_data.signal, signal_data.pyramid = signal, pyramid
+            n_loaded += len(payloads)
+        info_str = "Signals of {} cached ECGs are loaded in {:.2f} seconds"
+        self.logger.info(info_str.format(n_loaded, time.perf_counter() - start_time))
+
+    def _import_legacy_annotation(self):
+        if not self.annotation_store.is_new:
             return
-        with open(self.annotation_count_path, encoding="utf-8") as json_data:
-            annotation_count_dict = json.load(json_data)
-        for annotation in self.annotation_count_dict:
-            self.annotation_count_dict[annotation] += annotation_count_dict.get(annotation, 0)
+        annotation_count_dict = {}
+        if os.path.isfile(self.annotation_count_path):
+            with open(self.annotation_count_path, encoding="utf-8") as json_data:
+                annotation_count_dict = json.load(json_data)
+        annotations = {}
+        if os.path.isfile(self.submitted_annotation_path):
+            import pandas as pd
+            df = pd.read_feather(self.submitted_annotation_path).set_index("index")
+            labels = np.array(df.columns)
+            for annotation, count in zip(labels, df.values.sum(axis=0)):
+                annotation_count_dict[annotation] = annotation_count_dict.get(annotation, 0) + int(count)
+            annotations = {file_name: labels[row].tolist() for file_name, row in zip(df.index, df.values != 0)}
+        self.annotation_store.import_annotations(annotations, annotation_count_dict)
+        if not annotation_count_dict and not annotations:
+            self.logger.debug("There are no legacy annotations to import")
+        else:
+            self.logger.info("Legacy annotations for {} signals are imported".format(len(annotations)))
+
+    def _load_annotation_count(self):
+        self.annotation_matrix.add_counts(self.annotation_store.load_counts())
         self.logger.debug("Counts for submitted annotations are loaded")
 
-    def _load_submitted_annotation(self):
-        if not os.path.isfile(self.submitted_annotation_path):
+    def _load_submitted_annotation(self, prune=True):
+        annotations = self.annotation_store.load_annotations()
+        if not annotations:
             self.logger.debug("There are no submitted annotations")
             return
-        df = pd.read_feather(self.submitted_annotation_path).set_index("index")
-        counts = df.sum()
-        for annotation in self.annotation_count_dict:
-            self.annotation_count_dict[annotation] += int(counts.get(annotation, 0))
-        n_loaded = 0
-        for sha, signal_data in self.data.items():
-            if signal_data["file_name"] in df.index:
-                annotation = df.loc[signal_data["file_name"]]
-                annotation = annotation[annotation != 0].index.tolist()
-                diff = sorted(set(annotation) - set(self.annotation_count_dict.keys()))
-                if diff:
-                    debug_str = "Submitted annotation for signal {} contains unknown values {} and will not be used"
-                    self.logger.debug(debug_str.format(signal_data["file_name"], ", ".join(diff)))
-                else:
-                    signal_data["annotation"] = annotation
-                    n_loaded += 1
-        self.logger.debug("Submitted annotations for {} signals are loaded".format(n_loaded))
+        loaded_annotations = {}
+        for file_name, annotation in annotations.items():
+            sha = self.data.get_sha(file_name)
+            if sha is None:
+                self.pending_annotations[file_name] = annotation
+                if prune and not os.path.isfile(os.path.join(self.watch_dir, file_name)):
+                    self.logger.debug("Signal {} no longer exists, its annotation is removed".format(file_name))
+                    self._drop_pending_annotation(file_name)
+                continue
+            diff = sorted(set(self.annotation_matrix.get_unknown(annotation)))
+            if diff:
+                debug_str = "Submitted annotation for signal {} contains unknown values {} and will not be used"
+                self.logger.debug(debug_str.format(file_name, ", ".join(diff)))
+            else:
+                loaded_annotations[sha] = annotation
+            self.pending_annotations.pop(file_name, None)
+        self.data.set_annotations(loaded_annotations)
+        self.annotation_matrix.load(loaded_annotations)
+        self.logger.debug("Submitted annotations for {} signals are loaded".format(len(loaded_annotations)))
 
     def _remove_file(self, path):
         self.logger.debug("The same ECG already exists, deleting the file {}".format(path))
         os.remove(path)
+        self._remove_cache_entry(os.path.basename(path))
+
+    def _remove_cache_entry(self, file_name):
+        if self.disk_cache is not None:
+            self.disk_cache.remove(file_name)
 
-    def _update_data(self, path, retries=1, timeout=0.1):
-        sha, signal_data = load_data(path, retries, timeout)
+    def _save_cache(self):
+        if self.disk_cache is not None:
+            self.disk_cache.save()
+
+    def _parse_data(self, paths, retries=1, timeout=0.1):
+        keep_signal = not self.is_lazy_loading_enabled or self.disk_cache is not None
+        load = partial(try_load_data, retries=retries, timeout=timeout, keep_signal=keep_signal,
+                       use_native_reader=self.is_native_reader_enabled)
+        if self.executor is None or len(paths) < 2:
+            return [load(path) for path in paths]
+        chunksize = max(1, len(paths) // (4 * self.n_workers))
+        return list(self.executor.map(load, paths, chunksize=chunksize))
+
+    def _read_data(self, paths, retries=1, timeout=0.1):
+        if self.disk_cache is None:
+            return self._parse_data(paths, retries, timeout)
+        keep_signal = not self.is_lazy_loading_enabled
+        cached_data = [self.disk_cache.get(path, keep_signal) for path in paths]
+        missing_paths = [path for path, data in zip(paths, cached_data) if data is None]
+        parsed_data = self._parse_data(missing_paths, retries, timeout)
+        for path, result in zip(missing_paths, parsed_data):
+            if isinstance(result, Exception):
+                continue
+            sha, signal_data = result
+            self.disk_cache.put(path, sha, signal_data)
+            if not keep_signal:
+                signal_data.drop_signal()
+        self.disk_cache.save()
+        debug_str = "{} ECGs are loaded from the signal cache, {} ECGs are parsed"
+        self.logger.debug(debug_str.format(len(paths) - len(missing_paths), len(missing_paths)))
+        parsed_data = iter(parsed_data)
+        return [data if data is not None else next(parsed_data) for data in cached_data]
+
+    def _merge_results(self, paths, results):
+        failed_paths = []
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                failed_paths.append((path, result))
+            else:
+                self._merge_data(path, *result)
+        return failed_paths
+
+    def _merge_data(self, path, sha, signal_data):
+        signal_data.timestamp_str = signal_data.timestamp.strftime(self.TIMESTAMP_FORMAT)
         existing_data = self.data.get(sha)
         if existing_data is None:
-            self.data[sha] = signal_data
-        elif existing_data["modification_time"] > signal_data["modification_time"]:
-            if existing_data["annotation"]:
-                signal_data["annotation"] = existing_data["annotation"]
-                self._dump_annotation()
-            self.data[sha] = signal_data
-            self._remove_file(os.path.join(self.watch_dir, existing_data["file_name"]))
+            self.data.add(sha, signal_data)
+            self._restore_pending_annotation(sha, signal_data.file_name)
+        elif existing_data.file_name == signal_data.file_name:
+            signal_data.annotation = existing_data.annotation
+            self.data.add(sha, signal_data)
+        elif existing_data.modification_time > signal_data.modification_time:
+            if existing_data.annotation:
+                signal_data.annotation = existing_data.annotation
+                self.annotation_store.rename(existing_data.file_name, signal_data.file_name)
+            self.data.add(sha, signal_data)
+            self._remove_file(os.path.join(self.watch_dir, existing_data.file_name))
         else:
             self._remove_file(path)
 
-    def _encode_annotation(self, annotation):
-        return np.isin(list(self.annotation_count_dict.keys()), annotation).astype(int)
+    def _restore_pending_annotation(self, sha, file_name):
+        annotation = self.pending_annotations.pop(file_name, None)
+        if annotation and not self.annotation_matrix.get_unknown(annotation):
+            self.data.set_annotation(sha, annotation)
+            self.annotation_matrix.load({sha: annotation})
 
-    def _dump_annotation(self):
-        annotations = []
-        for sha, signal_data in self.data.items():
-            if signal_data["annotation"]:
-                annotations.append((signal_data["file_name"], self._encode_annotation(signal_data["annotation"])))
-        if not annotations:
-            self.logger.info("No annotation to dump")
+    def _drop_pending_annotation(self, file_name):
+        annotation = self.pending_annotations.pop(file_name, None)
+        if not annotation:
+            return False
+        self.annotation_store.remove_annotation(file_name, annotation)
+        self.annotation_matrix.add_counts({label: -1 for label in annotation})
+        return True
+
+    def _write_annotation(self, path, file_names, labels):
+        if not file_names:
+            self.logger.info("No annotation to export")
             return
-        index, annotations = zip(*annotations)
-        annotations = np.array(annotations)
-        self.logger.info("Dumping annotations for {}".format(", ".join(index)))
-        df = pd.DataFrame(annotations, index=index, columns=list(self.annotation_count_dict.keys())).reset_index()
-        df.to_feather(self.submitted_annotation_path)
-        self.logger.info("Dump finished into {}".format(self.submitted_annotation_path))
-
-    @synchronized
+        import pandas as pd
+        self.logger.info("Exporting annotations for {}".format(", ".join(file_names)))
+        df = pd.DataFrame(labels.astype(int), index=file_names, columns=self.annotation_matrix.labels).reset_index()
+        df.to_feather(path)
+
+    def _get_list_item(self, sha):
+        signal_data = self.data[sha]
+        ecg_data = {
+            "id": sha,
+            "timestamp": signal_data.timestamp_str,
+            "isAnnotated": bool(signal_data.annotation),
+        }
+        return ecg_data
+
+    def _pop_list_patch(self):
+        changes = self.data.pop_changes()
+        if not changes:
+            return None
+        self.list_version += 1
+        patch = {"version": self.list_version, "added": [], "removed": [], "changed": []}
+        for sha, change in changes.items():
+            patch[change].append(sha if change == "removed" else self._get_list_item(sha))
+        return patch
+
+    def _send_list_patch(self, patch):
+        if patch is None:
+            return
+        debug_str = "Sending list patch: {} added, {} removed, {} changed"
+        self.logger.debug(debug_str.format(len(patch["added"]), len(patch["removed"]), len(patch["changed"])))
+        self.namespace.notify("ECG_LIST_PATCH", patch)
+
+    def _get_record(self, sha):
+        if sha is None or sha not in self.data:
+            raise ValueError("Invalid sha {}".format(sha))
+        return self.data[sha]
+
+    def _get_signal_payload(self, sha, signal_data):
+        if signal_data.signal is not None:
+            return signal_data.signal, signal_data.pyramid
+        payload = self.signal_cache.get(sha)
+        if payload is None:
+            signal = freeze_signal(self._read_signal(sha, signal_data))
+            payload = (signal, build_pyramid(signal))
+            self.signal_cache.put(sha, payload)
+        self.logger.debug("Signal cache stats: {}".format(self.signal_cache.get_stats()))
+        return payload
+
+    def _read_signal(self, sha, signal_data, mmap_mode=None):
+        signal = self.disk_cache.load_signal(sha, mmap_mode) if self.disk_cache is not None else None
+        if signal is None:
+            signal = load_signal(os.path.join(self.watch_dir, signal_data.file_name),
+                                 use_native_reader=self.is_native_reader_enabled)
+        return signal
+
+    def _get_export_signal(self, sha, signal_data):
+        if signal_data.signal is not None:
+            return signal_data.signal
+        payload = self.signal_cache.get(sha)
+        if payload is not None:
+            return payload[0]
+        return self._read_signal(sha, signal_data, mmap_mode="r")
+
+    def _get_encoded_signal(self, sha, signal_data, signal_format):
+        key = (sha, signal_format)
+        encoded_signal = self.signal_cache.get(key)
+        if encoded_signal is None:
+            signal, _ = self._get_signal_payload(sha, signal_data)
+            if signal_format == "json":
+                encoded_signal = (to_json_list(signal), None)
+            else:
+                encoded_signal = encode_signal(signal, signal_format)
+            self.signal_cache.put(key, encoded_signal)
+        return encoded_signal
+
+    def _is_signal_ready(self, sha, signal_format):
+        return (sha, signal_format) in self.signal_cache
+
+    def _drop_cached_signal(self, sha):
+        self.signal_cache.pop(sha)
+        for signal_format in SIGNAL_FORMATS:
+            self.signal_cache.pop((sha, signal_format))
+            with self.prefetch_lock:
+                self.prefetched_keys.discard((sha, signal_format))
+
+    def _prefetch_neighbors(self, sha, signal_format):
+        with self.lock.read_lock():
+            if sha not in self.data:
+                return
+            next_unannotated, _ = self.data.get_neighbors(sha, self.prefetch_size, is_annotated=False)
+            next_shas, previous_shas = self.data.get_neighbors(sha, self.prefetch_size)
+            shas = OrderedDict.fromkeys(next_unannotated + next_shas + previous_shas)
+            records = [(neighbor_sha, self.data[neighbor_sha]) for neighbor_sha in shas]
+        for neighbor_sha, signal_data in records:
+            if not self.prefetch_queue.empty():
+                return
+            if not self._is_signal_ready(neighbor_sha, signal_format):
+                self._get_encoded_signal(neighbor_sha, signal_data, signal_format)
+                with self.prefetch_lock:
+                    self.prefetched_keys.add((neighbor_sha, signal_format))
+                self.logger.debug("Signal {} is prefetched".format(signal_data.file_name))
+
+    def _watch_prefetch_requests(self):
+        while True:
+            request = self.prefetch_queue.get()
+            try:
+                while True:
+                    request = self.prefetch_queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._prefetch_neighbors(*request)
+            except Exception as error:
+                self.logger.exception(error)
+
+    @read_locked
     def _get_annotation_list(self, data, meta):
         data = [{"id": group, "annotations": annotations} for group, annotations in self.annotation_dict.items()]
         return dict(data=data, meta=meta)
 
-    @synchronized
+    @read_locked
     def _get_common_annotation_list(self, data, meta):
         N_TOP = 5
         STOPWORDS = ["Неинтерпретируемая ЭКГ", "Другая патология", "Другая патология из этой группы"]
         DEFAULTS = ["Нормальный ритм"]
-        positive_count = {annotation: count for annotation, count in self.annotation_count_dict.items()
-                          if count > 0 and not any(word in annotation for word in STOPWORDS)}
-        annotations = sorted(positive_count, key=lambda x: (-positive_count[x], x))
+        mask = np.array([not any(word in label for word in STOPWORDS) for label in self.annotation_matrix.labels])
+        annotations = self.annotation_matrix.get_top(N_TOP, mask)
         for default in sorted(DEFAULTS):
             if default not in annotations:
                 annotations.append(default)
@@ -162,143 +485,494 @@ class EcgDirectoryHandler(RegexMatchingEventHandler):
         self.logger.debug("Top {} most common annotations: {}".format(N_TOP, ", ".join(annotations)))
         return dict(data=data, meta=meta)
 
-    @synchronized
+    @read_locked
     def _get_ecg_list(self, data, meta):
-        ecg_list = []
-        for sha, signal_data in self.data.items():
-            ecg_data = {
-                "id": sha,
-                "timestamp": signal_data["meta"]["timestamp"],
-                "isAnnotated": bool(signal_data["annotation"]),
-            }
-            ecg_list.append(ecg_data)
-        ecg_list = sorted(ecg_list, key=lambda val: val["timestamp"], reverse=True)
-        for ecg_data in ecg_list:
-            ecg_data["timestamp"] = ecg_data["timestamp"].strftime("%d.%m.%Y %H:%M:%S")
-        return dict(data=ecg_list, meta=meta)
-
-    @synchronized
+        ecg_list = [self._get_list_item(sha) for sha in self.data.get_ordered()]
+        return dict(data=ecg_list, meta=dict(meta or {}, listVersion=self.list_version))
+
+    @staticmethod
+    def _get_page_bounds(data):
+        offset = data.get("offset", 0)
+        limit = data.get("limit")
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Invalid offset {}".format(offset))
+        if limit is not None and (not isinstance(limit, int) or limit < 0):
+            raise ValueError("Invalid limit {}".format(limit))
+        return offset, limit
+
+    def _parse_timestamp(self, timestamp):
+        if timestamp is None:
+            return None
+        try:
+            return datetime.strptime(timestamp, self.TIMESTAMP_FORMAT)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid timestamp {}".format(timestamp))
+
+    @read_locked
+    def _get_ecg_list_page(self, data, meta):
+        offset, limit = self._get_page_bounds(data)
+        ecg_list = [self._get_list_item(sha) for sha in self.data.get_ordered(offset, limit)]
+        data = {"items": ecg_list, "offset": offset, "limit": limit, "total": len(self.data)}
+        return dict(data=data, meta=dict(meta or {}, listVersion=self.list_version))
+
+    @read_locked
+    def _query_ecg_list(self, data, meta):
+        offset, limit = self._get_page_bounds(data)
+        labels = data.get("labels") or []
+        unknown_labels = self.annotation_matrix.get_unknown(labels)
+        if unknown_labels:
+            raise ValueError("Unknown annotation: {}".format(", ".join(unknown_labels)))
+        is_annotated = data.get("isAnnotated")
+        start = self._parse_timestamp(data.get("start"))
+        end = self._parse_timestamp(data.get("end"))
+        if end is not None:
+            end += timedelta(seconds=1)
+        ids, total = self.data.query(labels, is_annotated, start, end, offset, limit)
+        data = {"ids": ids, "offset": offset, "limit": limit, "total": total}
+        return dict(data=data, meta=meta)
+
+    @read_locked
+    def _get_next_unannotated(self, data, meta):
+        sha = data.get("id")
+        data = {"id": sha, "nextId": self.data.get_next_unannotated(sha)}
+        return dict(data=data, meta=meta)
+
     def _get_item_data(self, data, meta):
         sha = data.get("id")
-        if sha is None or sha not in self.data:
-            raise ValueError("Invalid sha {}".format(sha))
-        signal_data = self.data[sha]
-        data["signal"] = signal_data["signal"]
-        data["frequency"] = signal_data["meta"]["fs"]
-        data["units"] = signal_data["meta"]["units"]
-        data["signame"] = signal_data["meta"]["signame"]
-        data["annotation"] = signal_data["annotation"]
+        signal_format = data.get("format", "json")
+        if signal_format not in SIGNAL_FORMATS:
+            raise ValueError("Unknown signal format {}".format(signal_format))
+        with self.lock.read_lock():
+            signal_data = self._get_record(sha)
+            data["frequency"] = signal_data.fs
+            data["units"] = signal_data.units
+            data["signame"] = signal_data.signame
+            data["annotation"] = signal_data.annotation
+        if self.prefetch_size:
+            with self.prefetch_lock:
+                is_prefetched = (sha, signal_format) in self.prefetched_keys
+                self.prefetched_keys.discard((sha, signal_format))
+            if not self._is_signal_ready(sha, signal_format):
+                self.metrics.count("prefetch_misses")
+            elif is_prefetched:
+                self.metrics.count("prefetch_hits")
+        data["signal"], signal_meta = self._get_encoded_signal(sha, signal_data, signal_format)
+        if signal_meta is not None:
+            data["signalMeta"] = signal_meta
+        if self.prefetch_size:
+            self.prefetch_queue.put((sha, signal_format))
+        return dict(data=data, meta=meta)
+
+    def _get_item_window(self, data, meta):
+        sha = data.get("id")
+        width = data.get("width")
+        if not isinstance(width, int) or width <= 0:
+            raise ValueError("Invalid width {}".format(width))
+        with self.lock.read_lock():
+            signal_data = self._get_record(sha)
+        signal, pyramid = self._get_signal_payload(sha, signal_data)
+        fs = signal_data.fs
+        signame = signal_data.signame
+        leads = data.get("leads", signame)
+        if isinstance(leads, str):
+            leads = [leads]
+        unknown_leads = [lead for lead in leads if lead not in signame]
+        if unknown_leads:
+            raise ValueError("Unknown leads: {}".format(", ".join(map(str, unknown_leads))))
+        n_samples = signal.shape[1]
+        start = min(max(int(data.get("start", 0) * fs), 0), n_samples)
+        end = min(max(int(np.ceil(data.get("end", n_samples / fs) * fs)), 0), n_samples)
+        if start >= end:
+            raise ValueError("Invalid time range [{}, {})".format(data.get("start"), data.get("end")))
+        lead_indices = [signame.index(lead) for lead in leads]
+        bucket, window = get_window(signal, pyramid, lead_indices, start, end, width)
+        data.update(window)
+        data["leads"] = leads
+        data["start"] = start // bucket * bucket / fs
+        data["bucket"] = bucket
+        data["frequency"] = fs / bucket
+        data["units"] = [signal_data.units[i] for i in lead_indices]
         return dict(data=data, meta=meta)
 
-    @synchronized
     def _set_annotation(self, data, meta):
         sha = data.get("id")
-        if sha is None or sha not in self.data:
-            raise ValueError("Invalid sha {}".format(sha))
         annotation = data.get("annotation")
         if annotation is None:
             raise ValueError("Empty annotation")
-        unknown_annotation = [ann for ann in annotation if ann not in self.annotation_count_dict]
+        unknown_annotation = self.annotation_matrix.get_unknown(annotation)
         if unknown_annotation:
             raise ValueError("Unknown annotation: {}".format(", ".join(unknown_annotation)))
-        for old_annotation in self.data[sha]["annotation"]:
-            self.annotation_count_dict[old_annotation] -= 1
-        self.data[sha]["annotation"] = annotation
-        for new_annotation in self.data[sha]["annotation"]:
-            self.annotation_count_dict[new_annotation] += 1
-        self._dump_annotation()
+        with self.lock.write_lock():
+            signal_data = self._get_record(sha)
+            if sha in self.dumping_signals:
+                raise ValueError("ECG {} is being dumped and can not be annotated".format(sha))
+            self.annotation_store.set_annotation(signal_data.file_name, signal_data.annotation, annotation)
+            self.annotation_matrix.set(sha, annotation)
+            self.data.set_annotation(sha, annotation)
+            patch = self._pop_list_patch()
         self.namespace.on_ECG_GET_COMMON_ANNOTATION_LIST({}, {})
-        self.namespace.on_ECG_GET_ITEM_DATA({"id": sha}, {})
+        self.namespace.notify("ECG_ANNOTATION_CHANGED", {"id": sha, "annotation": annotation})
+        self._send_list_patch(patch)
+
+    @read_locked
+    def _export_annotation(self, data, meta):
+        shas = [sha for sha in self.data if sha in self.annotation_matrix.rows]
+        file_names = [self.data[sha].file_name for sha in shas]
+        self._write_annotation(self.submitted_annotation_path, file_names, self.annotation_matrix.get(shas))
+        self.logger.info("Export finished into {}".format(self.submitted_annotation_path))
 
-    @synchronized
     def _dump_signals(self, data, meta):
-        annotated_signals = {signal_data["file_name"] for sha, signal_data in self.data.items()
-                             if signal_data["annotation"]}
-        if not annotated_signals:
-            self.logger.info("No annotated signals to dump")
-            return
-        self.logger.info("Dumping the following signals: {}".format(", ".join(sorted(annotated_signals))))
-        self.dumped_signals |= annotated_signals
-        dir_name = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-        dump_dir = os.path.join(self.dump_dir, dir_name)
-        os.makedirs(dump_dir)
-        annotation_file = os.path.basename(self.submitted_annotation_path)
-        shutil.move(self.submitted_annotation_path, os.path.join(dump_dir, annotation_file))
-
-        data = OrderedDict()
-        for sha, signal_data in self.data.items():
-            if signal_data["annotation"]:
-                shutil.move(os.path.join(self.watch_dir, signal_data["file_name"]),
-                            os.path.join(dump_dir, signal_data["file_name"]))
-            else:
-                data[sha] = signal_data
-        self.data = data
-        archive_name = shutil.make_archive(dump_dir, "zip", dump_dir)
+        with self.lock.write_lock():
+            if self.dump_thread is not None:
+                raise ValueError("Signals are already being dumped")
+            shas = [sha for sha in self.data if sha in self.annotation_matrix.rows]
+            if not shas:
+                self.logger.info("No annotated signals to dump")
+                self._notify_dump_progress(0, 0, None, is_finished=True)
+                return
+            file_names = [self.data[sha].file_name for sha in shas]
+            labels = self.annotation_matrix.get(shas)
+            self.dumping_signals = set(shas)
+            self.dump_thread = threading.Thread(target=self._run_dump, args=(shas, file_names, labels), daemon=True)
+            self.dump_thread.start()
 
-        def remove_readonly(func, path, _):
-            os.chmod(path, stat.S_IWRITE)
-            func(path)
-        shutil.rmtree(dump_dir, onerror=remove_readonly)
+    def _notify_dump_progress(self, n_done, n_total, archive_name, is_finished=False):
+        progress = {"done": n_done, "total": n_total, "archive": archive_name, "isFinished": is_finished}
+        self.namespace.notify("ECG_DUMP_PROGRESS", progress)
 
-        with open(self.annotation_count_path, "w", encoding="utf-8") as json_data:
-            json.dump(self.annotation_count_dict, json_data)
+    def _write_archive(self, archive_name, file_names, labels):
+        n_total = len(file_names)
+        last_notification_time = time.monotonic()
+        dumped_indices = []
+        open(archive_name, "x").close()
+        try:
+            with zipfile.ZipFile(archive_name + ".part", "w", zipfile.ZIP_DEFLATED) as archive:
+                for i, file_name in enumerate(file_names):
+                    try:
+                        archive.write(os.path.join(self.watch_dir, file_name), file_name)
+                    except FileNotFoundError:
+                        self.logger.warning("File {} disappeared during the dump and will be skipped".format(file_name))
+                    else:
+                        dumped_indices.append(i)
+                    if time.monotonic() - last_notification_time >= self.DUMP_PROGRESS_INTERVAL:
+                        self._notify_dump_progress(i + 1, n_total, os.path.basename(archive_name))
+                        last_notification_time = time.monotonic()
+                with io.BytesIO() as buffer:
+                    self._write_annotation(buffer, [file_names[i] for i in dumped_indices], labels[dumped_indices])
+                    annotation_file = os.path.basename(self.submitted_annotation_path)
+                    archive.writestr(annotation_file, buffer.getvalue())
+            os.replace(archive_name + ".part", archive_name)
+        except Exception:
+            os.remove(archive_name)
+            raise
+        return dumped_indices
 
-        self.logger.info("Dump finished into {}".format(archive_name))
+    def _commit_dump(self, shas, file_names):
+        dumped_signals = set()
+        for sha, file_name in zip(shas, file_names):
+            if self.data.get_sha(file_name) != sha:
+                continue
+            self.data.remove(sha)
+            self.annotation_matrix.discard(sha)
+            self._drop_cached_signal(sha)
+            self._remove_cache_entry(file_name)
+            dumped_signals.add(file_name)
+        self.annotation_store.remove_annotations(dumped_signals)
+        self.dumped_signals |= dumped_signals
+        return dumped_signals
+
+    def _get_dump_name(self, extension):
+        base_name = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-%f")
+        file_name = base_name + extension
+        n_attempts = 1
+        while any(os.path.exists(os.path.join(self.dump_dir, name)) for name in (file_name, file_name + ".part")):
+            file_name = "{}-{}{}".format(base_name, n_attempts, extension)
+            n_attempts += 1
+        return file_name
+
+    def _run_dump(self, shas, file_names, labels):
+        file_name = self._get_dump_name(".zip")
+        archive_name = os.path.join(self.dump_dir, file_name)
+        self.logger.info("Dumping {} signals into {}".format(len(shas), archive_name))
+        patch = None
+        try:
+            self._notify_dump_progress(0, len(shas), file_name)
+            dumped_indices = self._write_archive(archive_name, file_names, labels)
+            with self.lock.write_lock():
+                dumped_signals = self._commit_dump([shas[i] for i in dumped_indices],
+                                                   [file_names[i] for i in dumped_indices])
+                patch = self._pop_list_patch()
+        except Exception as error:
+            self.logger.exception(error)
+            if os.path.isfile(archive_name + ".part"):
+                os.remove(archive_name + ".part")
+            self.namespace.emit("ERROR", str(error))
+        else:
+            self.logger.info("Dump of {} signals finished into {}".format(len(dumped_signals), archive_name))
+            self._remove_dumped_files(dumped_signals)
+        finally:
+            with self.lock.write_lock():
+                self.dumping_signals = set()
+                self.dump_thread = None
+            self._notify_dump_progress(len(shas), len(shas), file_name, is_finished=True)
         self._log_data()
-        self.namespace.on_ECG_GET_LIST({}, {})
+        self._send_list_patch(patch)
+
+    def _remove_dumped_files(self, dumped_signals):
+        try:
+            self._save_cache()
+        except Exception as error:
+            self.logger.exception(error)
+        for dumped_file_name in dumped_signals:
+            try:
+                os.remove(os.path.join(self.watch_dir, dumped_file_name))
+            except OSError as error:
+                self.logger.error("Failed to remove dumped file {}: {}".format(dumped_file_name, error))
+                with self.lock.write_lock():
+                    self.dumped_signals.discard(dumped_file_name)
+                self.namespace.emit("ERROR", str(error))
+
+    def _export_dataset(self, data, meta):
+        with self.lock.write_lock():
+            if self.export_thread is not None:
+                raise ValueError("A dataset is already being exported")
+            shas = [sha for sha in self.data if sha in self.annotation_matrix.rows]
+            if not shas:
+                self.logger.info("No annotated signals to export")
+                self._notify_export_progress(0, 0, None, is_finished=True)
+                return
+            records = [self.data[sha] for sha in shas]
+            labels = self.annotation_matrix.get(shas)
+            self.export_thread = threading.Thread(target=self._run_export, args=(shas, records, labels), daemon=True)
+            self.export_thread.start()
+
+    def _notify_export_progress(self, n_done, n_total, dataset_name, is_finished=False):
+        progress = {"done": n_done, "total": n_total, "dataset": dataset_name, "isFinished": is_finished}
+        self.namespace.notify("ECG_EXPORT_PROGRESS", progress)
+
+    def _write_dataset(self, writer, dataset_name, shas, records, labels):
+        n_total = len(shas)
+        last_notification_time = time.monotonic()
+        for start in range(0, n_total, self.EXPORT_CHUNK_SIZE):
+            chunk_indices = []
+            signals = []
+            for i in range(start, min(start + self.EXPORT_CHUNK_SIZE, n_total)):
+                try:
+                    signals.append(self._get_export_signal(shas[i], records[i]))
+                except OSError:
+                    warning_str = "Signal {} disappeared during the export and will be skipped"
+                    self.logger.warning(warning_str.format(records[i].file_name))
+                else:
+                    chunk_indices.append(i)
+            writer.write_chunk([shas[i] for i in chunk_indices], [records[i] for i in chunk_indices], signals,
+                               labels[chunk_indices])
+            if time.monotonic() - last_notification_time >= self.DUMP_PROGRESS_INTERVAL:
+                self._notify_export_progress(start + len(chunk_indices), n_total, dataset_name)
+                last_notification_time = time.monotonic()
+        writer.close()
+
+    def _run_export(self, shas, records, labels):
+        dataset_name = self._get_dump_name(".dataset")
+        path = os.path.join(self.dump_dir, dataset_name)
+        self.logger.info("Exporting {} signals into {}".format(len(shas), path))
+        writer = None
+        try:
+            self._notify_export_progress(0, len(shas), dataset_name)
+            writer = DatasetWriter(path, self.annotation_matrix.labels)
+            self._write_dataset(writer, dataset_name, shas, records, labels)
+        except Exception as error:
+            self.logger.exception(error)
+            if writer is not None:
+                writer.abort()
+            self.namespace.emit("ERROR", str(error))
+        else:
+            self.logger.info("Export of {} signals finished into {}".format(len(writer), path))
+        finally:
+            with self.lock.write_lock():
+                self.export_thread = None
+            self._notify_export_progress(len(shas), len(shas), dataset_name, is_finished=True)
 
-    @synchronized
+    @write_locked
     def _shutdown(self, data, meta):
         os.kill(os.getpid(), signal.SIGINT)
 
-    @synchronized
-    def on_created(self, event):
-        src = os.path.basename(event.src_path)
-        self.logger.info("File created: {}".format(src))
-        self._update_data(event.src_path, retries=5)
-        self._log_data()
-        self.namespace.on_ECG_GET_LIST({}, {})
-
-    @synchronized
-    def on_deleted(self, event):
-        src = os.path.basename(event.src_path)
+    def _delete_file(self, src):
         if src in self.dumped_signals:
             self.dumped_signals.remove(src)
-            return
+            return False
         self.logger.info("File deleted: {}".format(src))
-        need_dump = False
-        data = OrderedDict()
-        for sha, signal_data in self.data.items():
-            if signal_data["file_name"] != src:
-                data[sha] = signal_data
-            elif signal_data["annotation"]:
-                for annotation in signal_data["annotation"]:
-                    self.annotation_count_dict[annotation] -= 1
-                need_dump = True
-        self.data = data
-        if need_dump:
-            self._dump_annotation()
+        sha, signal_data = self.data.remove_by_file_name(src)
+        if sha is None:
+            return self._drop_pending_annotation(src)
+        self._drop_cached_signal(sha)
+        self._remove_cache_entry(src)
+        if not signal_data.annotation:
+            return False
+        self.annotation_store.remove_annotation(src, signal_data.annotation)
+        self.annotation_matrix.set(sha, [])
+        return True
+
+    def _rename_file(self, src, dst):
+        self.logger.info("File renamed: {} -> {}".format(src, dst))
+        need_update = False
+        if self.data.get_sha(dst) is not None or dst in self.pending_annotations:
+            need_update = self._delete_file(dst)
+        sha = self.data.rename(src, dst)
+        if sha is not None:
+            if self.disk_cache is not None:
+                self.disk_cache.rename(src, dst)
+            if self.data[sha].annotation:
+                self.annotation_store.rename(src, dst)
+        elif src in self.pending_annotations:
+            self.pending_annotations[dst] = self.pending_annotations.pop(src)
+            self.annotation_store.rename(src, dst)
+        else:
+            self._queue_event("created", os.path.join(self.watch_dir, dst))
+        return need_update
+
+    def _coalesce_events(self, events):
+        created_paths = OrderedDict()
+        operations = []
+        for event_type, *paths in events:
+            if event_type == "moved":
+                src_match = re.match(self.pattern, os.path.basename(paths[0])) is not None
+                dst_match = re.match(self.pattern, os.path.basename(paths[1])) is not None
+                if not src_match:
+                    event_type, paths = "created", paths[1:]
+                elif not dst_match:
+                    event_type, paths = "deleted", paths[:1]
+            name = os.path.basename(paths[0])
+            if event_type == "created":
+                created_paths.pop(name, None)
+                created_paths[name] = paths[0]
+            elif event_type == "deleted":
+                if created_paths.pop(name, None) is None:
+                    operations.append(("deleted", name))
+            elif event_type == "moved":
+                dst = os.path.basename(paths[1])
+                if created_paths.pop(name, None) is not None:
+                    created_paths[dst] = paths[1]
+                else:
+                    operations.append(("moved", name, dst))
+        return list(created_paths.values()), operations
+
+    def _get_stable_paths(self, paths):
+        stable_paths = []
+        for path in paths:
+            name = os.path.basename(path)
+            try:
+                file_stat = os.stat(path)
+            except FileNotFoundError:
+                with self.event_condition:
+                    self.file_stats.pop(name, None)
+                continue
+            file_stat = (file_stat.st_size, file_stat.st_mtime)
+            with self.event_condition:
+                last_stat = self.file_stats.get(name)
+            if file_stat == last_stat:
+                stable_paths.append(path)
+            else:
+                self.logger.debug("File {} is still being written, postponing its loading".format(name))
+                self._queue_event("created", path, file_stat=file_stat)
+        return stable_paths
+
+    def _retry_failed_files(self, paths, failed_paths):
+        for path, error in failed_paths:
+            name = os.path.basename(path)
+            n_attempts = self.ingest_attempts.get(name, 0) + 1
+            if n_attempts < self.MAX_INGEST_ATTEMPTS and os.path.isfile(path):
+                self.logger.debug("Loading of {} failed, retrying in the next batch".format(name))
+                self.ingest_attempts[name] = n_attempts
+                self._queue_event("created", path)
+            else:
+                self.logger.error("File {} can not be loaded: {}".format(name, error))
+                self.ingest_attempts.pop(name, None)
+        failed_names = {os.path.basename(path) for path, _ in failed_paths}
+        with self.event_condition:
+            for path in paths:
+                name = os.path.basename(path)
+                if name not in failed_names:
+                    self.ingest_attempts.pop(name, None)
+                    self.file_stats.pop(name, None)
+
+    def _handle_events(self, events):
+        created_paths, operations = self._coalesce_events(events)
+        paths = self._get_stable_paths(created_paths)
+        if paths:
+            self.logger.info("Files created: {}".format(", ".join(os.path.basename(path) for path in paths)))
+        results = self._read_data(paths)
+        need_update = False
+        with self.lock.write_lock():
+            for operation in operations:
+                if operation[0] == "deleted":
+                    need_update |= self._delete_file(operation[1])
+                else:
+                    need_update |= self._rename_file(*operation[1:])
+            failed_paths = self._merge_results(paths, results)
+            patch = self._pop_list_patch()
+        self._save_cache()
+        self._retry_failed_files(paths, failed_paths)
+        if need_update:
             self.namespace.on_ECG_GET_COMMON_ANNOTATION_LIST({}, {})
         self._log_data()
-        self.namespace.on_ECG_GET_LIST({}, {})
+        self._send_list_patch(patch)
+
+    def _queue_event(self, event_type, *paths, file_stat=None):
+        if event_type in ("created", "modified") and file_stat is None:
+            try:
+                file_stat = os.stat(paths[0])
+                file_stat = (file_stat.st_size, file_stat.st_mtime)
+            except FileNotFoundError:
+                pass
+        with self.event_condition:
+            now = time.monotonic()
+            if not self.pending_events:
+                self.first_event_time = now
+            self.last_event_time = now
+            if event_type != "modified":
+                self.pending_events.append((event_type,) + paths)
+            name = os.path.basename(paths[0])
+            if file_stat is not None and (event_type == "created" or name in self.file_stats):
+                self.file_stats[name] = file_stat
+            self.event_condition.notify()
+
+    def _wait_events(self):
+        with self.event_condition:
+            while not self.pending_events:
+                self.event_condition.wait()
+            while True:
+                now = time.monotonic()
+                quiet_time = now - self.last_event_time
+                max_delay = self.MAX_COALESCING_DELAY * self.event_coalescing_window
+                if quiet_time >= self.event_coalescing_window or now - self.first_event_time >= max_delay:
+                    break
+                self.event_condition.wait(self.event_coalescing_window - quiet_time)
+            events, self.pending_events = self.pending_events, []
+        return events
+
+    def _watch_events(self):
+        while True:
+            events = self._wait_events()
+            self.logger.debug("Handling a batch of {} file events".format(len(events)))
+            try:
+                self._handle_events(events)
+            except Exception as error:
+                self.logger.exception(error)
+
+    def flush_events(self):
+        with self.event_condition:
+            events, self.pending_events = self.pending_events, []
+        if events:
+            self._handle_events(events)
+
+    def on_created(self, event):
+        self._queue_event("created", event.src_path)
+
+    def on_modified(self, event):
+        self._queue_event("modified", event.src_path)
+
+    def on_deleted(self, event):
+        self._queue_event("deleted", event.src_path)
 
-    @synchronized
     def on_moved(self, event):
-        src = os.path.basename(event.src_path)
-        src_match = re.match(self.pattern, src) is not None
-        dst = os.path.basename(event.dest_path)
-        dst_match = re.match(self.pattern, dst) is not None
-        if not src_match and dst_match:
-            return self.on_created(FileSystemEvent(event.dest_path))
-        elif src_match and not dst_match:
-            return self.on_deleted(FileSystemEvent(event.src_path))
-        self.logger.info("File renamed: {} -> {}".format(src, dst))
-        need_dump = False
-        for sha, signal_data in self.data.items():
-            if signal_data["file_name"] == src:
-                signal_data["file_name"] = dst
-                need_dump = bool(signal_data["annotation"])
-        if need_dump:
-            self._dump_annotation()
-        self._log_data()
-        self.namespace.on_ECG_GET_LIST({}, {})
+        self._queue_event("moved", event.src_path, event.dest_path)
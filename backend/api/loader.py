@@ -2,14 +2,42 @@ import os
 import sys
 import time
 import logging
+from datetime import datetime
+from functools import lru_cache
 from hashlib import sha256
+from xml.etree import ElementTree
 
 import numpy as np
 
+from .pyramid import build_pyramid
+from .record import EcgRecord, freeze_signal
+
 CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(1, os.path.join(CURRENT_PATH, "ecg"))
-from cardio.core.ecg_batch_tools import load_xml_schiller
-from cardio.core.utils import get_units_conversion_factor
+load_xml_schiller = None
+get_units_conversion_factor = None
+
+# Bump LOADER_VERSION whenever parsing or conversion changes the loaded signals to invalidate on-disk caches
+LOADER_VERSION = 2
+SIGNAL_UNITS = "mV"
+UNIT_PREFIXES = {"n": 1e-9, "u": 1e-6, "\u00b5": 1e-6, "\u03bc": 1e-6, "m": 1e-3, "k": 1e3}
+
+
+def get_cache_version(use_native_reader):
+    return "{}-{}-{}".format(LOADER_VERSION, SIGNAL_UNITS, "native" if use_native_reader else "cardio")
+
+
+def import_cardio():
+    global load_xml_schiller, get_units_conversion_factor
+    if load_xml_schiller is not None:
+        return 0
+    start_time = time.perf_counter()
+    from cardio.core.ecg_batch_tools import load_xml_schiller
+    from cardio.core.utils import get_units_conversion_factor
+    import_time = time.perf_counter() - start_time
+    logger = logging.getLogger("server." + __name__)
+    logger.info("CardIO imported in {:.2f} seconds".format(import_time))
+    return import_time
 
 
 def sha256_checksum(path, block_size=2**16):
@@ -21,6 +49,7 @@ def sha256_checksum(path, block_size=2**16):
 
 
 def _convert_units(signal, meta, units):
+    import_cardio()
     old_units = meta["units"]
     new_units = [units] * len(old_units)
     factors = [get_units_conversion_factor(old, new) for old, new in zip(old_units, new_units)]
@@ -30,36 +59,126 @@ def _convert_units(signal, meta, units):
     return signal, meta
 
 
-def _load_signal(path, retries=1, timeout=0.1):
+def _split_units(units):
+    if len(units) > 1 and units[0] in UNIT_PREFIXES:
+        return UNIT_PREFIXES[units[0]], units[1:]
+    return 1.0, units
+
+
+@lru_cache(maxsize=None)
+def _get_units_factor(old_units, new_units):
+    old_factor, old_base = _split_units(old_units)
+    new_factor, new_base = _split_units(new_units)
+    if old_base == new_base:
+        return old_factor / new_factor
+    import_cardio()
+    return get_units_conversion_factor(old_units, new_units)
+
+
+def _find_text(element, path):
+    child = element.find(path)
+    if child is None or child.text is None:
+        raise ValueError("Element {} is not found".format(path))
+    return child.text.strip()
+
+
+def read_xml_schiller(buffer, units=SIGNAL_UNITS):
+    root = ElementTree.fromstring(buffer)
+    wavedata = next((element for element in root.iterfind("wavedata")
+                     if _find_text(element, "type") == "ECG_RHYTHMS"), None)
+    if wavedata is None:
+        raise ValueError("ECG_RHYTHMS wave data is not found")
+    fs = float(_find_text(wavedata, "resolution/samplerate/rate"))
+    scale = float(_find_text(wavedata, "resolution/yres/value"))
+    old_units = _find_text(wavedata, "resolution/yres/unit")
+    channels = wavedata.findall("channel")
+    if not channels:
+        raise ValueError("Lead data is not found")
+
+    signame = []
+    signal = None
+    for i, channel in enumerate(channels):
+        signame.append(_find_text(channel, "name"))
+        lead = np.fromstring(_find_text(channel, "data"), dtype=np.float32, sep=",")
+        if signal is None:
+            signal = np.empty((len(channels), len(lead)), dtype=np.float32)
+        if len(lead) != signal.shape[1]:
+            raise ValueError("Leads have different lengths")
+        signal[i] = lead
+    signal *= np.float32(scale * _get_units_factor(old_units, units))
+
+    timestamp = _find_text(root, "eventdata/event/date") + _find_text(root, "eventdata/event/time")
+    meta = {
+        "fs": fs,
+        "units": [units] * len(signame),
+        "signame": signame,
+        "timestamp": datetime.strptime(timestamp, "%Y%m%d%H%M%S"),
+    }
+    return signal, meta
+
+
+def _load_cardio(path):
+    import_cardio()
+    signal, meta = load_xml_schiller(path, ["signal", "meta"])
+    signal, meta = _convert_units(signal, meta, SIGNAL_UNITS)
+    meta["units"] = meta["units"].tolist()
+    meta["signame"] = meta["signame"].tolist()
+    return signal, meta, None
+
+
+def _load_native(path):
+    with open(path, "rb") as xml_file:
+        buffer = xml_file.read()
+    try:
+        signal, meta = read_xml_schiller(buffer)
+    except Exception as err:
+        logger = logging.getLogger("server." + __name__)
+        logger.debug("Native reader failed with {!r}, falling back to cardio".format(err))
+        return _load_cardio(path)
+    return signal, meta, sha256(buffer).hexdigest()
+
+
+def _load_signal(path, retries=1, timeout=0.1, use_native_reader=False):
     last_err = None
     logger = logging.getLogger("server." + __name__)
     logger.debug("Loading the file from {}".format(path))
+    load = _load_native if use_native_reader else _load_cardio
     for _ in range(retries):
         try:
-            signal, meta = load_xml_schiller(path, ["signal", "meta"])
+            signal, meta, sha = load(path)
         except Exception as err:
             logger.debug("Loading failed, retrying after {} seconds".format(timeout))
             last_err = err
             time.sleep(timeout)
         else:
-            signal, meta = _convert_units(signal, meta, "mV")
-            signal = signal.tolist()
-            meta["units"] = meta["units"].tolist()
-            meta["signame"] = meta["signame"].tolist()
             logger.debug("Loading finished")
-            return signal, meta
+            return signal, meta, sha
     else:
         raise last_err
 
 
-def load_data(path, retries=1, timeout=0.1):
-    signal, meta = _load_signal(path, retries, timeout)
-    sha = sha256_checksum(path)
-    signal_data = {
-        "file_name": os.path.basename(path),
-        "modification_time": os.path.getmtime(path),
-        "signal": signal,
-        "meta": meta,
-        "annotation": [],
-    }
+def load_signal(path, retries=1, timeout=0.1, use_native_reader=False):
+    signal, _, _ = _load_signal(path, retries, timeout, use_native_reader)
+    return signal
+
+
+def load_data(path, retries=1, timeout=0.1, keep_signal=True, use_native_reader=False):
+    signal, meta, sha = _load_signal(path, retries, timeout, use_native_reader)
+    if sha is None:
+        sha = sha256_checksum(path)
+    signal_data = create_signal_data(os.path.basename(path), os.path.getmtime(path),
+                                     signal if keep_signal else None, meta)
     return sha, signal_data
+
+
+def try_load_data(path, retries=1, timeout=0.1, keep_signal=True, use_native_reader=False):
+    try:
+        return load_data(path, retries, timeout, keep_signal, use_native_reader)
+    except Exception as err:
+        return err
+
+
+def create_signal_data(file_name, modification_time, signal, meta):
+    signal = freeze_signal(signal)
+    return EcgRecord(file_name, modification_time, meta["fs"], meta["units"], meta["signame"], meta["timestamp"],
+                     signal, build_pyramid(signal) if signal is not None else None)
@@ -0,0 +1,147 @@
+import json
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+SIZE_BUCKETS = tuple(2**i for i in range(8, 26, 2))
+
+
+def get_binary_size(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(get_binary_size(value) for value in obj.values())
+    return 0
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_stats(self):
+        cumulative_counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative_counts.append(total)
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {"buckets": dict(zip(bounds, cumulative_counts)), "sum": self.sum, "count": self.count}
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.payload_size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self.lock_wait = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.errors = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.gauges = {}
+
+    def observe_latency(self, event, latency):
+        with self.lock:
+            self.latency[event].observe(latency)
+
+    def observe_payload_size(self, event, direction, size):
+        with self.lock:
+            self.payload_size[(event, direction)].observe(size)
+
+    def observe_lock_wait(self, mode, wait_time):
+        with self.lock:
+            self.lock_wait[mode].observe(wait_time)
+
+    def count_error(self, event):
+        with self.lock:
+            self.errors[event] += 1
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "latency": {event: hist.get_stats() for event, hist in self.latency.items()},
+                "payloadSize": {"{}/{}".format(event, direction): hist.get_stats()
+                                for (event, direction), hist in self.payload_size.items()},
+                "lockWait": {mode: hist.get_stats() for mode, hist in self.lock_wait.items()},
+                "errors": dict(self.errors),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    @staticmethod
+    def _format_labels(labels):
+        return ",".join('{}="{}"'.format(name, value) for name, value in labels)
+
+    def _format_histogram(self, lines, name, labels, hist):
+        stats = hist.get_stats()
+        label_str = self._format_labels(labels)
+        prefix = label_str + "," if label_str else ""
+        for bound, count in stats["buckets"].items():
+            lines.append('{}_bucket{{{}le="{}"}} {}'.format(name, prefix, bound, count))
+        lines.append("{}_sum{{{}}} {}".format(name, label_str, stats["sum"]))
+        lines.append("{}_count{{{}}} {}".format(name, label_str, stats["count"]))
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            lines.append("# TYPE ecg_event_latency_seconds histogram")
+            for event, hist in sorted(self.latency.items()):
+                self._format_histogram(lines, "ecg_event_latency_seconds", [("event", event)], hist)
+            lines.append("# TYPE ecg_payload_size_bytes histogram")
+            for (event, direction), hist in sorted(self.payload_size.items()):
+                labels = [("event", event), ("direction", direction)]
+                self._format_histogram(lines, "ecg_payload_size_bytes", labels, hist)
+            lines.append("# TYPE ecg_lock_wait_seconds histogram")
+            for mode, hist in sorted(self.lock_wait.items()):
+                self._format_histogram(lines, "ecg_lock_wait_seconds", [("mode", mode)], hist)
+            lines.append("# TYPE ecg_event_errors_total counter")
+            for event, count in sorted(self.errors.items()):
+                lines.append('ecg_event_errors_total{{event="{}"}} {}'.format(event, count))
+            for name, value in sorted(self.counters.items()):
+                lines.append("# TYPE ecg_{}_total counter".format(name))
+                lines.append("ecg_{}_total {}".format(name, value))
+            for name, value in sorted(self.gauges.items()):
+                lines.append("# TYPE ecg_{} gauge".format(name))
+                lines.append("ecg_{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+
+class MeteredJSON:
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    @staticmethod
+    def _get_event(data):
+        if isinstance(data, list) and data and isinstance(data[0], str):
+            return data[0]
+        return None
+
+    def dumps(self, obj, *args, **kwargs):
+        encoded = json.dumps(obj, *args, **kwargs)
+        event = self._get_event(obj)
+        if event is not None:
+            self.metrics.observe_payload_size(event, "out", len(encoded))
+        return encoded
+
+    def loads(self, s, *args, **kwargs):
+        obj = json.loads(s, *args, **kwargs)
+        event = self._get_event(obj)
+        if event is not None:
+            self.metrics.observe_payload_size(event, "in", len(s))
+        return obj
@@ -0,0 +1,41 @@
+import numpy as np
+
+from .transport import to_json_list
+
+
+PYRAMID_FACTOR = 4
+PYRAMID_MIN_LENGTH = 256
+
+
+def build_pyramid(signal, factor=PYRAMID_FACTOR, min_length=PYRAMID_MIN_LENGTH):
+    signal = np.asarray(signal, dtype=np.float32)
+    levels = []
+    bucket = 1
+    lower, upper = signal, signal
+    while lower.shape[-1] > min_length:
+        pad = -lower.shape[-1] % factor
+        lower = np.pad(lower, ((0, 0), (0, pad)), mode="edge").reshape(lower.shape[0], -1, factor).min(axis=-1)
+        upper = np.pad(upper, ((0, 0), (0, pad)), mode="edge").reshape(upper.shape[0], -1, factor).max(axis=-1)
+        bucket *= factor
+        levels.append({"bucket": bucket, "min": lower, "max": upper})
+    return levels
+
+
+def select_level(pyramid, n_samples, width):
+    level = None
+    for candidate in pyramid:
+        if candidate["bucket"] * width > n_samples:
+            break
+        level = candidate
+    return level
+
+
+def get_window(signal, pyramid, leads, start, end, width):
+    n_samples = end - start
+    level = select_level(pyramid, n_samples, width) if n_samples > 2 * width else None
+    if level is None:
+        return 1, {"signal": to_json_list(np.asarray(signal)[leads, start:end])}
+    bucket = level["bucket"]
+    start, end = start // bucket, -(-end // bucket)
+    return bucket, {"min": to_json_list(level["min"][leads, start:end]),
+                    "max": to_json_list(level["max"][leads, start:end])}
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+_INTERNED_TUPLES = {}
+
+
+def intern_tuple(values):
+    values = tuple(values)
+    return _INTERNED_TUPLES.setdefault(values, values)
+
+
+def freeze_signal(signal):
+    if signal is None:
+        return None
+    signal = np.ascontiguousarray(signal, dtype=np.float32)
+    signal.flags.writeable = False
+    return signal
+
+
+class EcgRecord:
+    __slots__ = ("file_name", "modification_time", "fs", "units", "signame", "timestamp", "timestamp_str",
+                 "signal", "pyramid", "annotation")
+
+    def __init__(self, file_name, modification_time, fs, units, signame, timestamp, signal=None, pyramid=None,
+                 annotation=()):
+        self.file_name = file_name
+        self.modification_time = modification_time
+        self.fs = float(fs)
+        self.units = intern_tuple(units)
+        self.signame = intern_tuple(signame)
+        self.timestamp = timestamp
+        self.timestamp_str = None
+        self.signal = freeze_signal(signal)
+        self.pyramid = pyramid
+        self.annotation = annotation
+
+    def __reduce__(self):
+        args = (self.file_name, self.modification_time, self.fs, self.units, self.signame, self.timestamp,
+                self.signal, self.pyramid, self.annotation)
+        return EcgRecord, args
+
+    def __repr__(self):
+        return "EcgRecord({!r}, {}, {} leads)".format(self.file_name, self.timestamp, len(self.signame))
+
+    def drop_signal(self):
+        self.signal = None
+        self.pyramid = None
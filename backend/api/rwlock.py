@@ -0,0 +1,79 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    def __init__(self, on_wait=None):
+        self.condition = threading.Condition(threading.Lock())
+        self.on_wait = on_wait
+        self.readers = {}
+        self.writer = None
+        self.writer_count = 0
+        self.n_waiting_writers = 0
+
+    def acquire_read(self):
+        thread_id = threading.get_ident()
+        with self.condition:
+            if self.writer == thread_id or thread_id in self.readers:
+                self.readers[thread_id] = self.readers.get(thread_id, 0) + 1
+                return
+            start_time = time.perf_counter()
+            while self.writer is not None or self.n_waiting_writers:
+                self.condition.wait()
+            self.readers[thread_id] = 1
+        if self.on_wait is not None:
+            self.on_wait("read", time.perf_counter() - start_time)
+
+    def release_read(self):
+        thread_id = threading.get_ident()
+        with self.condition:
+            count = self.readers[thread_id] - 1
+            if count:
+                self.readers[thread_id] = count
+            else:
+                del self.readers[thread_id]
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        thread_id = threading.get_ident()
+        with self.condition:
+            if self.writer == thread_id:
+                self.writer_count += 1
+                return
+            if thread_id in self.readers:
+                raise RuntimeError("A read lock can not be upgraded to a write lock")
+            start_time = time.perf_counter()
+            self.n_waiting_writers += 1
+            try:
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+            finally:
+                self.n_waiting_writers -= 1
+            self.writer = thread_id
+            self.writer_count = 1
+        if self.on_wait is not None:
+            self.on_wait("write", time.perf_counter() - start_time)
+
+    def release_write(self):
+        with self.condition:
+            self.writer_count -= 1
+            if not self.writer_count:
+                self.writer = None
+                self.condition.notify_all()
+
+    @contextmanager
+    def read_lock(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_lock(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
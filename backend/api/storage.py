@@ -0,0 +1,92 @@
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class AnnotationStore:
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.logger = logging.getLogger("server." + __name__)
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        schema_version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        self.is_new = schema_version == 0
+        if schema_version > self.SCHEMA_VERSION:
+            raise ValueError("Annotation store {} has unsupported schema version {}".format(path, schema_version))
+        with self.transaction() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS annotation (file_name TEXT PRIMARY KEY, labels TEXT NOT NULL)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS annotation_count (label TEXT PRIMARY KEY, "
+                           "count INTEGER NOT NULL)")
+        self.logger.debug("Annotation store {} is opened".format(path))
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            else:
+                cursor.execute("COMMIT")
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def _update_counts(cursor, labels, delta):
+        for label in labels:
+            cursor.execute("INSERT OR IGNORE INTO annotation_count (label, count) VALUES (?, 0)", (label,))
+            cursor.execute("UPDATE annotation_count SET count = count + ? WHERE label = ?", (delta, label))
+
+    def load_annotations(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT file_name, labels FROM annotation").fetchall()
+        return {file_name: json.loads(labels) for file_name, labels in rows}
+
+    def load_counts(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT label, count FROM annotation_count").fetchall()
+        return dict(rows)
+
+    def import_annotations(self, annotations, counts):
+        with self.transaction() as cursor:
+            cursor.executemany("INSERT OR REPLACE INTO annotation (file_name, labels) VALUES (?, ?)",
+                               [(file_name, json.dumps(labels)) for file_name, labels in annotations.items()])
+            for label, count in counts.items():
+                self._update_counts(cursor, [label], count)
+            cursor.execute("PRAGMA user_version={}".format(self.SCHEMA_VERSION))
+        self.is_new = False
+        self.logger.debug("{} annotations are imported into the annotation store".format(len(annotations)))
+
+    def set_annotation(self, file_name, old_labels, new_labels):
+        with self.transaction() as cursor:
+            if new_labels:
+                cursor.execute("INSERT OR REPLACE INTO annotation (file_name, labels) VALUES (?, ?)",
+                               (file_name, json.dumps(new_labels)))
+            else:
+                cursor.execute("DELETE FROM annotation WHERE file_name = ?", (file_name,))
+            self._update_counts(cursor, old_labels, -1)
+            self._update_counts(cursor, new_labels, 1)
+
+    def remove_annotation(self, file_name, labels):
+        self.set_annotation(file_name, labels, [])
+
+    def remove_annotations(self, file_names):
+        with self.transaction() as cursor:
+            cursor.executemany("DELETE FROM annotation WHERE file_name = ?", [(name,) for name in file_names])
+
+    def rename(self, src, dst):
+        with self.transaction() as cursor:
+            cursor.execute("UPDATE annotation SET file_name = ? WHERE file_name = ?", (dst, src))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
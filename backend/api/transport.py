@@ -0,0 +1,34 @@
+import numpy as np
+
+
+SIGNAL_FORMATS = ("json", "float32", "int16")
+INT16_MAX = np.iinfo(np.int16).max
+JSON_DECIMALS = 6
+
+
+def to_json_list(signal):
+    return np.round(np.asarray(signal, dtype=np.float64), JSON_DECIMALS).tolist()
+
+
+def encode_signal(signal, signal_format):
+    signal = np.asarray(signal, dtype=np.float32)
+    if signal_format == "float32":
+        scale = 1.0
+        buffer = signal.astype("<f4")
+    elif signal_format == "int16":
+        max_abs = float(np.abs(signal).max()) if signal.size else 0.0
+        scale = max_abs / INT16_MAX if max_abs > 0 else 1.0
+        buffer = np.round(signal / scale).astype("<i2")
+    else:
+        raise ValueError("Unknown signal format {}".format(signal_format))
+    signal_meta = {
+        "shape": list(buffer.shape),
+        "dtype": buffer.dtype.str,
+        "scale": scale,
+    }
+    return np.ascontiguousarray(buffer).tobytes(), signal_meta
+
+
+def decode_signal(buffer, signal_meta):
+    signal = np.frombuffer(buffer, dtype=signal_meta["dtype"]).reshape(signal_meta["shape"])
+    return signal.astype(np.float32) * np.float32(signal_meta["scale"])
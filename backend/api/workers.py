@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class WorkerPoolFullError(RuntimeError):
+    pass
+
+
+class WorkerPool:
+    def __init__(self, n_workers, queue_size, async_mode="threading", on_change=None):
+        self.n_workers = n_workers
+        self.queue_size = queue_size
+        self.async_mode = async_mode
+        self.on_change = on_change
+        self.slots = threading.BoundedSemaphore(n_workers + queue_size)
+        self.n_pending = 0
+        self.lock = threading.Lock()
+        if async_mode == "eventlet":
+            from eventlet import tpool
+            tpool.set_num_threads(n_workers)
+            self._execute = tpool.execute
+        elif async_mode == "gevent":
+            from gevent.threadpool import ThreadPool
+            self.pool = ThreadPool(n_workers)
+            self._execute = lambda fn, *args: self.pool.apply(fn, args)
+        else:
+            self.pool = ThreadPoolExecutor(n_workers, thread_name_prefix="request_worker")
+            self._execute = lambda fn, *args: self.pool.submit(fn, *args).result()
+
+    def _change_pending(self, delta):
+        with self.lock:
+            self.n_pending += delta
+            n_pending = self.n_pending
+        if self.on_change is not None:
+            self.on_change(n_pending)
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise WorkerPoolFullError("Server is busy: {} requests are already pending".format(
+                self.n_workers + self.queue_size))
+        self._change_pending(1)
+        try:
+            return self._execute(fn, *args)
+        finally:
+            self._change_pending(-1)
+            self.slots.release()
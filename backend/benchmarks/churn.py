@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.collection import EcgCollection
+from api.record import EcgRecord
+
+
+def check_consistency(collection):
+    assert len(collection.records) == len(collection.file_names)
+    assert len(collection.records) == len(collection.order)
+    for sha, record in collection.items():
+        assert collection.get_sha(record.file_name) == sha
+    assert collection.order == sorted(collection.order)
+    assert sorted(collection.annotated_order + collection.unannotated_order) == collection.order
+
+
+def make_record(i):
+    return EcgRecord("{}.xml".format(i), 0, 500, (), (), datetime(2018, 1, 1) + timedelta(seconds=i))
+
+
+def run_churn(n_records, n_events, seed=42):
+    rng = random.Random(seed)
+    collection = EcgCollection()
+    timings = {}
+
+    start_time = time.perf_counter()
+    for i in range(n_records):
+        collection.add("{:064x}".format(i), make_record(i))
+    timings["create"] = time.perf_counter() - start_time
+
+    next_id = n_records
+    counts = {"create": 0, "delete": 0, "move": 0}
+    start_time = time.perf_counter()
+    for _ in range(n_events):
+        event = rng.choice(["create", "delete", "move"])
+        if event == "create" or not collection:
+            collection.add("{:064x}".format(next_id), make_record(next_id))
+            next_id += 1
+            event = "create"
+        else:
+            record = collection.get_by_file_name("{}.xml".format(rng.randrange(next_id)))
+            if record is None:
+                record = next(iter(collection.values()))
+            file_name = record.file_name
+            if event == "delete":
+                collection.remove_by_file_name(file_name)
+            else:
+                collection.rename(file_name, "{}.xml".format(next_id))
+                next_id += 1
+        counts[event] += 1
+    timings["churn"] = time.perf_counter() - start_time
+    check_consistency(collection)
+    return {"n_records": n_records, "n_events": n_events, "events": counts, "size": len(collection),
+            "time": timings, "time_per_event": timings["churn"] / n_events}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise EcgCollection with create/delete/move churn.")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--events", type=int, default=100000)
+    args = parser.parse_args()
+    print(json.dumps(run_churn(args.records, args.events), indent=4))
+
+
+if __name__ == "__main__":
+    main()
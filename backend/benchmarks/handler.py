@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import argparse
+
+from watchdog.events import FileCreatedEvent
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.handler import EcgDirectoryHandler
+from api.loader import load_data
+from benchmarks.schiller import generate_dataset
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config")
+
+
+class NullNamespace:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def get_peak_rss():
+    if resource is None:
+        return None
+    factor = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * factor,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * factor,
+    }
+
+
+def measure(results, name, func, n_calls=1):
+    start_time = time.perf_counter()
+    func()
+    total_time = time.perf_counter() - start_time
+    results[name] = {"n_calls": n_calls, "time": total_time, "time_per_call": total_time / max(n_calls, 1),
+                     "peak_rss": get_peak_rss()}
+
+
+def create_handler(work_dir, args):
+    handler = EcgDirectoryHandler(
+        watch_dir=os.path.join(work_dir, "watch"),
+        dump_dir=os.path.join(work_dir, "dump"),
+        annotation_list_path=os.path.join(CONFIG_DIR, "annotation_list.json"),
+        annotation_count_path=os.path.join(work_dir, "annotation_count.json"),
+        submitted_annotation_path=os.path.join(work_dir, "annotation.feather"),
+        annotation_db_path=os.path.join(work_dir, "annotation.db"),
+        is_lazy_loading_enabled=args.lazy,
+        is_native_reader_enabled=args.native_reader,
+        signal_cache_size=args.signal_cache_size,
+        n_workers=args.workers,
+        cache_dir=os.path.join(work_dir, "cache") if args.disk_cache else None,
+        event_coalescing_window=3600,
+        prefetch_size=args.prefetch_size,
+        ignore_directories=True,
+    )
+    handler.namespace = NullNamespace()
+    handler.start_warm_up()
+    handler.wait_ready()
+    return handler
+
+
+def run_benchmarks(work_dir, args):
+    rng = random.Random(args.seed)
+    watch_dir = os.path.join(work_dir, "watch")
+    staging_dir = os.path.join(work_dir, "staging")
+    os.makedirs(os.path.join(work_dir, "dump"), exist_ok=True)
+    results = {}
+
+    measure(results, "generate", lambda: generate_dataset(watch_dir, args.files, args.duration, seed=args.seed),
+            args.files)
+    load_data(os.path.join(watch_dir, sorted(os.listdir(watch_dir))[0]), use_native_reader=args.native_reader)
+
+    handlers = []
+    measure(results, "load_data", lambda: handlers.append(create_handler(work_dir, args)), args.files)
+    handler = handlers[0]
+
+    burst_paths = generate_dataset(staging_dir, args.burst, args.duration, seed=args.seed, start_index=args.files)
+
+    def created_burst():
+        for path in burst_paths:
+            dst = os.path.join(watch_dir, os.path.basename(path))
+            os.replace(path, dst)
+            handler.on_created(FileCreatedEvent(dst))
+        handler.flush_events()
+
+    measure(results, "on_created", created_burst, args.burst)
+    assert len(handler.data) == args.files + args.burst
+
+    measure(results, "get_ecg_list", lambda: [handler._get_ecg_list({}, {}) for _ in range(args.calls)],
+            args.calls)
+
+    shas = rng.sample(list(handler.data.keys()), min(args.calls, len(handler.data)))
+    measure(results, "get_item_data",
+            lambda: [handler._get_item_data({"id": sha, "format": args.format}, {}) for sha in shas], len(shas))
+
+    labels = handler.annotation_matrix.labels
+    annotations = [rng.sample(labels, rng.randint(1, 3)) for _ in shas]
+    measure(results, "set_annotation",
+            lambda: [handler._set_annotation({"id": sha, "annotation": annotation}, {})
+                     for sha, annotation in zip(shas, annotations)], len(shas))
+
+    def export_dataset():
+        handler._export_dataset({}, {})
+        export_thread = handler.export_thread
+        if export_thread is not None:
+            export_thread.join()
+
+    measure(results, "export_dataset", export_dataset, len(shas))
+
+    def dump_signals():
+        handler._dump_signals({}, {})
+        dump_thread = handler.dump_thread
+        if dump_thread is not None:
+            dump_thread.join()
+
+    measure(results, "dump_signals", dump_signals, len(shas))
+    assert len(handler.data) == args.files + args.burst - len(shas)
+
+    if handler.executor is not None:
+        handler.executor.shutdown()
+    handler.annotation_store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time EcgDirectoryHandler hot paths on synthetic Schiller XMLs.")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--lazy", action="store_true")
+    parser.add_argument("--disk-cache", action="store_true")
+    parser.add_argument("--native-reader", action="store_true")
+    parser.add_argument("--signal-cache-size", type=int, default=2**28)
+    parser.add_argument("--prefetch-size", type=int, default=0)
+    parser.add_argument("--format", default="json")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", help="A directory for generated data, a temporary one by default.")
+    parser.add_argument("--output", help="A path to a json file with results, stdout by default.")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="ecg_benchmark_")
+    try:
+        results = run_benchmarks(work_dir, args)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    report = {"config": {key: value for key, value in vars(args).items() if key not in ("work_dir", "output")},
+              "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as json_data:
+            json.dump(report, json_data, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
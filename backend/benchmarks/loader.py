@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.loader import load_data
+from benchmarks.schiller import generate_dataset
+
+
+def compare_signal_data(native_data, cardio_data):
+    native_sha, native_signal_data = native_data
+    cardio_sha, cardio_signal_data = cardio_data
+    native_signal = native_signal_data.signal
+    cardio_signal = cardio_signal_data.signal
+    mismatches = []
+    if native_sha != cardio_sha:
+        mismatches.append("sha")
+    for key in ["fs", "units", "signame", "timestamp"]:
+        if getattr(native_signal_data, key) != getattr(cardio_signal_data, key):
+            mismatches.append(key)
+    if native_signal.shape != cardio_signal.shape:
+        mismatches.append("shape")
+        return mismatches, None
+    max_error = float(np.max(np.abs(native_signal - cardio_signal))) if native_signal.size else 0.0
+    if not np.allclose(native_signal, cardio_signal, rtol=1e-6, atol=1e-6):
+        mismatches.append("signal")
+    return mismatches, max_error
+
+
+def time_loader(paths, use_native_reader):
+    results = []
+    start_time = time.perf_counter()
+    for path in paths:
+        results.append(load_data(path, use_native_reader=use_native_reader))
+    return results, time.perf_counter() - start_time
+
+
+def run_comparison(paths):
+    cardio_results, cardio_time = time_loader(paths, use_native_reader=False)
+    native_results, native_time = time_loader(paths, use_native_reader=True)
+    mismatched_files = {}
+    max_error = 0.0
+    for path, native_data, cardio_data in zip(paths, native_results, cardio_results):
+        mismatches, error = compare_signal_data(native_data, cardio_data)
+        if mismatches:
+            mismatched_files[os.path.basename(path)] = mismatches
+        if error is not None:
+            max_error = max(max_error, error)
+    return {
+        "n_files": len(paths),
+        "cardio_time": cardio_time,
+        "native_time": native_time,
+        "speedup": cardio_time / native_time,
+        "max_abs_error": max_error,
+        "mismatched_files": mismatched_files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the native Schiller XML reader with the cardio one.")
+    parser.add_argument("--directory", help="A directory with real Schiller XMLs, synthetic files by default.")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.directory:
+        paths = [os.path.join(args.directory, f) for f in sorted(os.listdir(args.directory)) if f.endswith(".xml")]
+        print(json.dumps(run_comparison(paths[:args.files]), indent=4))
+        return
+    work_dir = tempfile.mkdtemp(prefix="ecg_loader_benchmark_")
+    try:
+        paths = generate_dataset(work_dir, args.files, args.duration, seed=args.seed)
+        print(json.dumps(run_comparison(paths), indent=4))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.loader import create_signal_data
+from api.pyramid import build_pyramid
+
+SIGNAME = ["I", "II", "III", "aVR", "aVL", "aVF", "V1", "V2", "V3", "V4", "V5", "V6"]
+
+
+def create_dict_signal_data(file_name, modification_time, signal, meta):
+    return {
+        "file_name": file_name,
+        "modification_time": modification_time,
+        "signal": signal.tolist(),
+        "pyramid": build_pyramid(signal),
+        "meta": meta,
+        "annotation": [],
+    }
+
+
+def make_meta(i):
+    return {
+        "fs": 500.0,
+        "units": ["mV"] * len(SIGNAME),
+        "signame": list(SIGNAME),
+        "timestamp": datetime(2018, 1, 1) + timedelta(seconds=i),
+    }
+
+
+def measure(create, n_records, n_samples, seed):
+    rng = np.random.RandomState(seed)
+    signals = [rng.randn(len(SIGNAME), n_samples) for _ in range(n_records)]
+    tracemalloc.start()
+    records = [create("{}.xml".format(i), 0.0, signal, make_meta(i)) for i, signal in enumerate(signals)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size / n_records
+
+
+def run_comparison(n_records, duration, fs, seed=42):
+    n_samples = int(duration * fs)
+    dict_size = measure(create_dict_signal_data, n_records, n_samples, seed)
+    record_size = measure(create_signal_data, n_records, n_samples, seed)
+    return {
+        "n_records": n_records,
+        "n_leads": len(SIGNAME),
+        "n_samples": n_samples,
+        "dict_bytes_per_record": dict_size,
+        "record_bytes_per_record": record_size,
+        "dict_gb_per_10k": dict_size * 10000 / 2**30,
+        "record_gb_per_10k": record_size * 10000 / 2**30,
+        "saved_gb_per_10k": (dict_size - record_size) * 10000 / 2**30,
+        "ratio": dict_size / record_size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory footprint of dict and slotted ECG records.")
+    parser.add_argument("--records", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--fs", type=float, default=500)
+    args = parser.parse_args()
+    print(json.dumps(run_comparison(args.records, args.duration, args.fs), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.collection import EcgCollection
+from api.record import EcgRecord
+
+
+LABELS = ["label_{}".format(i) for i in range(20)]
+
+
+def make_record(i, rng):
+    annotation = rng.sample(LABELS, rng.choice([0, 0, 1, 1, 2, 3]))
+    return EcgRecord("{}.xml".format(i), 0, 500, (), (), datetime(2018, 1, 1) + timedelta(seconds=i),
+                     annotation=annotation)
+
+
+def brute_force_query(collection, labels=(), is_annotated=None, start=None, end=None):
+    shas = []
+    for sha in collection.get_ordered():
+        record = collection[sha]
+        timestamp = record.timestamp
+        if not set(labels).issubset(record.annotation):
+            continue
+        if is_annotated is not None and bool(record.annotation) != is_annotated:
+            continue
+        if (start is not None and timestamp < start) or (end is not None and timestamp >= end):
+            continue
+        shas.append(sha)
+    return shas
+
+
+def make_queries(n_records, n_queries, rng):
+    queries = []
+    for _ in range(n_queries):
+        start = datetime(2018, 1, 1) + timedelta(seconds=rng.randrange(n_records))
+        query = {
+            "labels": rng.sample(LABELS, rng.choice([0, 1, 1, 2])),
+            "is_annotated": rng.choice([None, True, False]),
+            "start": rng.choice([None, start]),
+            "end": rng.choice([None, start + timedelta(seconds=rng.randrange(n_records))]),
+        }
+        queries.append(query)
+    return queries
+
+
+def run_queries(n_records, n_queries, n_checks, limit, seed=42):
+    rng = random.Random(seed)
+    collection = EcgCollection()
+    for i in range(n_records):
+        collection.add("{:064x}".format(i), make_record(i, rng))
+
+    queries = make_queries(n_records, n_queries, rng)
+    start_time = time.perf_counter()
+    for query in queries:
+        collection.query(offset=0, limit=limit, **query)
+    query_time = time.perf_counter() - start_time
+
+    shas = list(collection.keys())
+    start_time = time.perf_counter()
+    for _ in range(n_queries):
+        collection.get_next_unannotated(rng.choice(shas))
+    next_time = time.perf_counter() - start_time
+
+    for query in queries[:n_checks]:
+        expected = brute_force_query(collection, **query)
+        assert collection.query(**query) == (expected, len(expected))
+        assert collection.query(offset=5, limit=10, **query) == (expected[5:15], len(expected))
+    unannotated = set(brute_force_query(collection, is_annotated=False))
+    for sha in rng.sample(shas, n_checks):
+        expected = next((other for other in collection.get_ordered() if other in unannotated and
+                         collection[other].timestamp < collection[sha].timestamp), None)
+        assert collection.get_next_unannotated(sha) == expected
+
+    return {"n_records": n_records, "n_queries": n_queries, "limit": limit,
+            "time_per_query": query_time / n_queries, "time_per_next_unannotated": next_time / n_queries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure indexed EcgCollection queries.")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--checks", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(run_queries(args.records, args.queries, args.checks, args.limit), indent=4))
+
+
+if __name__ == "__main__":
+    main()
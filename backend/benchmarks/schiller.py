@@ -0,0 +1,97 @@
+import os
+import json
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+SIGNAMES = ["I", "II", "III", "aVR", "aVL", "aVF", "V1", "V2", "V3", "V4", "V5", "V6"]
+LEAD_GAINS = [1.0, 1.4, 0.6, -1.2, 0.3, 1.0, -0.8, 0.4, 1.2, 1.6, 1.3, 0.9]
+
+XML_TEMPLATE = """<?xml version="1.0" encoding="ISO-8859-1"?>
+<examdescript>
+  <patdata>
+    <id>{patient_id}</id>
+  </patdata>
+  <eventdata>
+    <event>
+      <date>{date}</date>
+      <time>{time}</time>
+    </event>
+  </eventdata>
+  <wavedata>
+    <type>ECG_RHYTHMS</type>
+    <resolution>
+      <samplerate>
+        <rate>{fs}</rate>
+        <unit>Hz</unit>
+      </samplerate>
+      <yres>
+        <value>1</value>
+        <unit>uV</unit>
+      </yres>
+    </resolution>
+{channels}
+  </wavedata>
+</examdescript>
+"""
+
+CHANNEL_TEMPLATE = """    <channel>
+      <name>{name}</name>
+      <data>{data}</data>
+    </channel>"""
+
+
+def generate_signal(duration, fs, rng):
+    n_samples = int(duration * fs)
+    t = np.arange(n_samples) / fs
+    heart_rate = rng.uniform(50, 110)
+    beat_phase = (t * heart_rate / 60 + rng.uniform()) % 1
+    waves = [(0.15, 0.025, 150), (0.3, 0.008, -100), (0.32, 0.01, 1000), (0.34, 0.008, -250), (0.6, 0.04, 300)]
+    beat = sum(amplitude * np.exp(-((beat_phase - center) / width) ** 2 / 2)
+               for center, width, amplitude in waves)
+    baseline = 50 * np.sin(2 * np.pi * rng.uniform(0.1, 0.5) * t + rng.uniform(0, 2 * np.pi))
+    gains = np.array(LEAD_GAINS).reshape(-1, 1) * rng.uniform(0.8, 1.2, size=(len(SIGNAMES), 1))
+    noise = rng.normal(0, 10, size=(len(SIGNAMES), n_samples))
+    return np.rint(gains * beat + baseline + noise).astype(np.int32)
+
+
+def generate_xml(path, duration=10, fs=500, timestamp=None, seed=None):
+    rng = np.random.RandomState(seed)
+    timestamp = timestamp or datetime(2018, 1, 1)
+    signal = generate_signal(duration, fs, rng)
+    channels = [CHANNEL_TEMPLATE.format(name=name, data=",".join(map(str, lead.tolist())))
+                for name, lead in zip(SIGNAMES, signal)]
+    xml = XML_TEMPLATE.format(patient_id=rng.randint(10**8), date=timestamp.strftime("%Y%m%d"),
+                              time=timestamp.strftime("%H%M%S"), fs=fs, channels="\n".join(channels))
+    with open(path, "w", encoding="ISO-8859-1") as xml_file:
+        xml_file.write(xml)
+    return path
+
+
+def generate_dataset(directory, n_files, duration=10, fs=500, seed=42, start_index=0):
+    os.makedirs(directory, exist_ok=True)
+    base_timestamp = datetime(2018, 1, 1)
+    paths = []
+    for i in range(start_index, start_index + n_files):
+        path = os.path.join(directory, "{:08d}.xml".format(i))
+        generate_xml(path, duration, fs, base_timestamp + timedelta(minutes=i), seed + i)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Schiller XML files.")
+    parser.add_argument("directory")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--fs", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    paths = generate_dataset(args.directory, args.files, args.duration, args.fs, args.seed)
+    print(json.dumps({"directory": args.directory, "n_files": len(paths)}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
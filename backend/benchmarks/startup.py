@@ -0,0 +1,57 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+STAGES = {
+    "server": "import server",
+    "cardio": "from api.loader import import_cardio; import_cardio()",
+}
+
+
+def get_import_times(code):
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BACKEND_DIR,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode:
+        raise RuntimeError("Import failed: {}".format(process.stderr.strip().splitlines()[-1]))
+    package_times = defaultdict(int)
+    total_time = 0
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is None:
+            continue
+        self_time, cumulative_time, indent, module = match.groups()
+        package_times[module.split(".")[0]] += int(self_time)
+        if len(indent) == 1:
+            total_time += int(cumulative_time)
+    return total_time, package_times
+
+
+def get_breakdown(top):
+    breakdown = {}
+    for stage, code in STAGES.items():
+        total_time, package_times = get_import_times(code)
+        packages = sorted(package_times.items(), key=lambda item: -item[1])[:top]
+        breakdown[stage] = {
+            "total": total_time / 1e6,
+            "packages": {package: package_time / 1e6 for package, package_time in packages},
+        }
+    return breakdown
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Break down the import time of the backend by top-level package.")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    print(json.dumps(get_breakdown(args.top), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import tempfile
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timedelta
+from collections import defaultdict
+
+import numpy as np
+import socketio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.metrics import get_binary_size
+from benchmarks.schiller import generate_dataset, generate_xml
+
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CONFIG_DIR = os.path.join(BACKEND_DIR, "config")
+NAMESPACE = "/api"
+RESPONSE_EVENTS = {"ECG_GOT_ANNOTATION_LIST", "ECG_GOT_LIST", "ECG_GOT_ITEM_DATA", "ECG_GOT_METRICS"}
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_message_size(payload):
+    return len(json.dumps(payload, ensure_ascii=False, default=lambda obj: "")) + get_binary_size(payload)
+
+
+def get_labels(annotation_list):
+    labels = []
+    for group in annotation_list:
+        if not group["annotations"]:
+            labels.append(group["id"])
+        else:
+            labels.extend(group["id"] + "/" + annotation for annotation in group["annotations"])
+    return labels
+
+
+class SwarmStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.received = defaultdict(lambda: {"messages": 0, "bytes": 0})
+        self.errors = defaultdict(int)
+        self.timeouts = defaultdict(int)
+
+    def observe_latency(self, event, latency):
+        with self.lock:
+            self.latency[event].append(latency)
+
+    def observe_message(self, event, size):
+        with self.lock:
+            received = self.received[event]
+            received["messages"] += 1
+            received["bytes"] += size
+
+    def count_error(self, event):
+        with self.lock:
+            self.errors[event] += 1
+
+    def count_timeout(self, event):
+        with self.lock:
+            self.timeouts[event] += 1
+
+    def get_report(self, run_time, n_clients):
+        with self.lock:
+            latency = {}
+            for event, values in sorted(self.latency.items()):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                latency[event] = {"count": len(values), "p50": p50, "p95": p95, "p99": p99,
+                                  "max": max(values), "throughput": len(values) / run_time}
+            received = {}
+            for event, stats in sorted(self.received.items()):
+                received[event] = dict(stats, bytes_per_client=stats["bytes"] / n_clients,
+                                       is_response=event in RESPONSE_EVENTS)
+            fan_out_bytes = sum(stats["bytes"] for stats in received.values() if not stats["is_response"])
+            return {
+                "latency": latency,
+                "received": received,
+                "fan_out_bytes": fan_out_bytes,
+                "fan_out_bytes_per_second": fan_out_bytes / run_time,
+                "errors": dict(self.errors),
+                "timeouts": dict(self.timeouts),
+            }
+
+
+class Annotator:
+    def __init__(self, url, stats, rng, think_time, timeout, signal_format):
+        self.url = url
+        self.stats = stats
+        self.rng = rng
+        self.think_time = think_time
+        self.timeout = timeout
+        self.signal_format = signal_format
+        self.ids = set()
+        self.labels = []
+        self.is_ready = threading.Event()
+        self.condition = threading.Condition()
+        self.expected = None
+        self.response = None
+        self.client = socketio.Client(reconnection=False)
+        self.client.on("*", self._on_event, namespace=NAMESPACE)
+
+    def connect(self):
+        self.client.connect(self.url, namespaces=[NAMESPACE], transports=["websocket"])
+
+    def disconnect(self):
+        self.client.disconnect()
+
+    def _on_event(self, event, payload=None):
+        self.stats.observe_message(event, get_message_size(payload))
+        data = payload.get("data") if isinstance(payload, dict) else None
+        if event == "SERVER_READY" and data["isReady"]:
+            self.is_ready.set()
+        elif event == "ECG_GOT_LIST":
+            self.ids = {item["id"] for item in data}
+        elif event == "ECG_LIST_PATCH":
+            self.ids = (self.ids | {item["id"] for item in data["added"]}) - set(data["removed"])
+        elif event == "ECG_GOT_ANNOTATION_LIST":
+            self.labels = get_labels(data)
+        with self.condition:
+            if self.expected is None:
+                return
+            event_out, sha = self.expected
+            is_error = event == "ERROR"
+            if is_error or (event == event_out and (sha is None or data.get("id") == sha)):
+                self.response = payload if not is_error else None
+                self.expected = None
+                self.condition.notify_all()
+
+    def request(self, event_in, data, event_out, sha=None):
+        with self.condition:
+            self.expected = (event_out, sha)
+            self.response = None
+        start_time = time.perf_counter()
+        self.client.emit(event_in, (data, {}), namespace=NAMESPACE)
+        with self.condition:
+            is_done = self.condition.wait_for(lambda: self.expected is None, self.timeout)
+            response = self.response
+            self.expected = None
+        if not is_done:
+            self.stats.count_timeout(event_in)
+        elif response is None:
+            self.stats.count_error(event_in)
+        else:
+            self.stats.observe_latency(event_in, time.perf_counter() - start_time)
+        return response
+
+    def think(self):
+        time.sleep(self.rng.uniform(0, 2 * self.think_time))
+
+    def run(self, stop_time):
+        self.request("ECG_GET_ANNOTATION_LIST", None, "ECG_GOT_ANNOTATION_LIST")
+        self.request("ECG_GET_LIST", None, "ECG_GOT_LIST")
+        while time.monotonic() < stop_time:
+            if not self.ids or not self.labels:
+                self.think()
+                continue
+            sha = self.rng.choice(sorted(self.ids))
+            self.request("ECG_GET_ITEM_DATA", {"id": sha, "format": self.signal_format}, "ECG_GOT_ITEM_DATA", sha)
+            self.think()
+            annotation = self.rng.sample(self.labels, self.rng.randint(1, 2))
+            self.request("ECG_SET_ANNOTATION", {"id": sha, "annotation": annotation}, "ECG_ANNOTATION_CHANGED", sha)
+            self.think()
+            if self.rng.random() < 0.1:
+                self.request("ECG_GET_LIST", None, "ECG_GOT_LIST")
+
+
+def write_configs(work_dir, args):
+    with open(os.path.join(CONFIG_DIR, "logger_config.json"), encoding="utf-8") as json_data:
+        logger_config = json.load(json_data)
+    logger_config["handlers"]["stdout_handler"]["level"] = "WARNING"
+    logger_config["handlers"]["file_handler"]["filename"] = os.path.join(work_dir, "server.log")
+    logger_config["loggers"]["server"]["level"] = "INFO"
+    logger_config_path = os.path.join(work_dir, "logger_config.json")
+    with open(logger_config_path, "w", encoding="utf-8") as json_data:
+        json.dump(logger_config, json_data, indent=4)
+
+    server_config = {
+        "is_shutdown_enabled": False,
+        "watch_dir": os.path.join(work_dir, "watch"),
+        "dump_dir": os.path.join(work_dir, "dump"),
+        "annotation_list_path": os.path.join(CONFIG_DIR, "annotation_list.json"),
+        "annotation_count_path": os.path.join(work_dir, "annotation_count.json"),
+        "submitted_annotation_path": os.path.join(work_dir, "annotation.feather"),
+        "annotation_db_path": os.path.join(work_dir, "annotation.db"),
+        "is_lazy_loading_enabled": args.lazy,
+        "is_native_reader_enabled": args.native_reader,
+        "signal_cache_size": args.signal_cache_size,
+        "n_workers": args.workers,
+        "cache_dir": os.path.join(work_dir, "cache"),
+        "event_coalescing_window": 0.5,
+        "prefetch_size": args.prefetch_size,
+        "n_request_workers": args.request_workers,
+        "request_queue_size": args.request_queue_size,
+        "logger_config_path": logger_config_path,
+    }
+    server_config_path = os.path.join(work_dir, "server_config.json")
+    with open(server_config_path, "w", encoding="utf-8") as json_data:
+        json.dump(server_config, json_data, indent=4)
+    return server_config_path
+
+
+def start_server(work_dir, args):
+    server_config_path = write_configs(work_dir, args)
+    port = get_free_port()
+    log_file = open(os.path.join(work_dir, "server.out"), "w")
+    process = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "server.py"), "-c", server_config_path,
+                                "-p", str(port)], cwd=BACKEND_DIR, stdout=log_file, stderr=subprocess.STDOUT)
+    return process, log_file, "http://127.0.0.1:{}".format(port)
+
+
+def wait_server(process, url, stats, timeout):
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < timeout:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited with code {}".format(process.returncode))
+        probe = Annotator(url, stats, random.Random(), 0, timeout, "float32")
+        try:
+            probe.connect()
+        except socketio.exceptions.ConnectionError:
+            time.sleep(0.2)
+            continue
+        is_ready = probe.is_ready.wait(timeout - (time.perf_counter() - start_time))
+        probe.disconnect()
+        if is_ready:
+            return time.perf_counter() - start_time
+    raise RuntimeError("Server is not ready after {} seconds".format(timeout))
+
+
+def feed_files(watch_dir, staging_dir, file_rate, duration, start_index, stop_event):
+    n_added = 0
+    base_timestamp = datetime(2019, 1, 1)
+    while not stop_event.wait(1 / file_rate):
+        file_name = "{:08d}.xml".format(start_index + n_added)
+        path = generate_xml(os.path.join(staging_dir, file_name), duration,
+                            timestamp=base_timestamp + timedelta(minutes=n_added), seed=start_index + n_added)
+        os.replace(path, os.path.join(watch_dir, file_name))
+        n_added += 1
+    return n_added
+
+
+def get_server_metrics(url, stats, timeout):
+    annotator = Annotator(url, stats, random.Random(), 0, timeout, "float32")
+    annotator.connect()
+    response = annotator.request("ECG_GET_METRICS", None, "ECG_GOT_METRICS")
+    annotator.disconnect()
+    if response is None:
+        return None
+    metrics = response["data"]
+    return {"counters": metrics["counters"], "errors": metrics["errors"], "gauges": metrics["gauges"]}
+
+
+def run_swarm(work_dir, args):
+    watch_dir = os.path.join(work_dir, "watch")
+    staging_dir = os.path.join(work_dir, "staging")
+    os.makedirs(staging_dir, exist_ok=True)
+    os.makedirs(os.path.join(work_dir, "dump"), exist_ok=True)
+    generate_dataset(watch_dir, args.files, args.duration, seed=args.seed)
+
+    process, log_file, url = start_server(work_dir, args)
+    try:
+        setup_stats = SwarmStats()
+        startup_time = wait_server(process, url, setup_stats, args.startup_timeout)
+        stats = SwarmStats()
+        annotators = [Annotator(url, stats, random.Random(args.seed + i), args.think_time, args.timeout, args.format)
+                      for i in range(args.clients)]
+        for annotator in annotators:
+            annotator.connect()
+
+        stop_event = threading.Event()
+        n_added = []
+        feeder = threading.Thread(target=lambda: n_added.append(
+            feed_files(watch_dir, staging_dir, args.file_rate, args.duration, args.files, stop_event)))
+        stop_time = time.monotonic() + args.run_time
+        threads = [threading.Thread(target=annotator.run, args=(stop_time,)) for annotator in annotators]
+        start_time = time.perf_counter()
+        if args.file_rate > 0:
+            feeder.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        run_time = time.perf_counter() - start_time
+        stop_event.set()
+        if args.file_rate > 0:
+            feeder.join()
+        for annotator in annotators:
+            annotator.disconnect()
+
+        report = stats.get_report(run_time, args.clients)
+        report.update({
+            "startup_time": startup_time,
+            "run_time": run_time,
+            "n_added_files": n_added[0] if n_added else 0,
+            "server": get_server_metrics(url, setup_stats, args.timeout),
+        })
+        return report
+    finally:
+        process.terminate()
+        process.wait()
+        log_file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test server.py with a swarm of simulated annotators.")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--run-time", type=float, default=30)
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause between requests in seconds.")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--file-rate", type=float, default=1, help="Files added to watch_dir per second.")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--format", default="float32")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--request-workers", type=int, default=4)
+    parser.add_argument("--request-queue-size", type=int, default=256)
+    parser.add_argument("--lazy", action="store_true")
+    parser.add_argument("--native-reader", action="store_true")
+    parser.add_argument("--signal-cache-size", type=int, default=2**28)
+    parser.add_argument("--prefetch-size", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", help="A directory for generated data and server logs, a temporary one by default.")
+    parser.add_argument("--output", help="A path to a json file with results, stdout by default.")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="ecg_swarm_")
+    try:
+        results = run_swarm(work_dir, args)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    report = {"config": {key: value for key, value in vars(args).items() if key not in ("work_dir", "output")},
+              "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as json_data:
+            json.dump(report, json_data, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
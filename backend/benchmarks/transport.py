@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.transport import encode_signal, decode_signal, to_json_list
+
+
+def make_signal(n_leads, n_samples, seed=42):
+    rng = np.random.RandomState(seed)
+    t = np.arange(n_samples) / 500
+    signal = np.sin(2 * np.pi * 1.2 * t) + 0.05 * rng.randn(n_leads, n_samples)
+    return signal.astype(np.float32).astype(np.float64)
+
+
+def measure(func, n_repeats):
+    times = []
+    for _ in range(n_repeats):
+        start_time = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start_time)
+    return result, float(np.median(times))
+
+
+def compare(signal, n_repeats):
+    results = []
+    signal_list = signal.tolist()
+    payload, encode_time = measure(lambda: json.dumps({"signal": to_json_list(signal)}), n_repeats)
+    decoded, decode_time = measure(lambda: json.loads(payload), n_repeats)
+    results.append({"format": "json", "size": len(payload.encode("utf-8")), "encode_time": encode_time,
+                    "decode_time": decode_time, "max_error": float(np.abs(np.array(decoded["signal"]) - signal).max())})
+    for signal_format in ["float32", "int16"]:
+        (buffer, signal_meta), encode_time = measure(lambda: encode_signal(signal_list, signal_format), n_repeats)
+        decoded, decode_time = measure(lambda: decode_signal(buffer, signal_meta), n_repeats)
+        size = len(buffer) + len(json.dumps({"signalMeta": signal_meta}))
+        results.append({"format": signal_format, "size": size, "encode_time": encode_time,
+                        "decode_time": decode_time, "max_error": float(np.abs(decoded - signal).max())})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and binary signal transport.")
+    parser.add_argument("--leads", type=int, default=12)
+    parser.add_argument("--durations", type=int, nargs="+", default=[10, 60, 300], help="Durations in seconds.")
+    parser.add_argument("--fs", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    report = []
+    for duration in args.durations:
+        signal = make_signal(args.leads, duration * args.fs)
+        for result in compare(signal, args.repeats):
+            result["duration"] = duration
+            report.append(result)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
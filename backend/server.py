@@ -4,10 +4,11 @@ import logging
 import logging.config
 import argparse
 
-from flask import Flask
+from flask import Flask, Response
 from flask_socketio import SocketIO
 
 from api.api import create_namespace
+from api.metrics import MeteredJSON
 
 
 def get_server_config(server_config_path, required_keys):
@@ -32,6 +33,7 @@ def get_configs():
     parser = argparse.ArgumentParser(description="A backend for an ECG annotation tool.")
     parser.add_argument("-c", "--config", help="A path to a json file with server configuration.",
                         default=default_config_path)
+    parser.add_argument("-p", "--port", help="A port to listen on.", type=int, default=9090)
     args = parser.parse_args()
 
     REQUIRED_KEYS = {
@@ -41,12 +43,22 @@ def get_configs():
         "annotation_list_path",
         "annotation_count_path",
         "submitted_annotation_path",
+        "annotation_db_path",
+        "is_lazy_loading_enabled",
+        "is_native_reader_enabled",
+        "signal_cache_size",
+        "n_workers",
+        "cache_dir",
+        "event_coalescing_window",
+        "prefetch_size",
+        "n_request_workers",
+        "request_queue_size",
         "logger_config_path",
     }
     server_config = get_server_config(args.config, REQUIRED_KEYS)
     logger_config_path = server_config.pop("logger_config_path")
     logger_config = get_logger_config(logger_config_path)
-    return server_config, logger_config
+    return server_config, logger_config, args.port
 
 
 def create_logger(logger_config):
@@ -57,16 +69,21 @@ def create_logger(logger_config):
 
 
 def main():
-    server_config, logger_config = get_configs()
+    server_config, logger_config, port = get_configs()
     logger = create_logger(logger_config)
     namespace = create_namespace(server_config)
 
     app = Flask(__name__)
-    socketio = SocketIO(app)
+    socketio = SocketIO(app, json=MeteredJSON(namespace.metrics))
     socketio.on_namespace(namespace)
+    namespace.handler.start_warm_up()
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(namespace.metrics.to_prometheus(), mimetype="text/plain; version=0.0.4")
 
     logger.info("Server launched")
-    socketio.run(app, host="0.0.0.0", port=9090)
+    socketio.run(app, host="0.0.0.0", port=port)
 
 
 if __name__ == "__main__":
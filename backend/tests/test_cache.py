@@ -0,0 +1,113 @@
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.cache import SignalDiskCache
+from api.record import EcgRecord
+
+VERSION = "2-mV-native"
+SHA = "{:064x}".format(1)
+
+
+def make_source(directory, file_name="1.xml", content="ecg"):
+    path = os.path.join(str(directory), file_name)
+    with open(path, "w") as f:
+        f.write(content)
+    return path
+
+
+def make_record(path):
+    signal = np.arange(24, dtype=np.float32).reshape(12, 2)
+    return EcgRecord(os.path.basename(path), os.path.getmtime(path), 500, ["mV"] * 12, [str(i) for i in range(12)],
+                     datetime(2018, 1, 1, 12, 30), signal=signal)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+@pytest.fixture
+def source(tmp_path):
+    return make_source(tmp_path)
+
+
+def fill_cache(cache_dir, path, version=VERSION):
+    cache = SignalDiskCache(cache_dir, version)
+    record = make_record(path)
+    cache.put(path, SHA, record)
+    cache.save()
+    return record
+
+
+def test_round_trip(cache_dir, source):
+    record = fill_cache(cache_dir, source)
+    cache = SignalDiskCache(cache_dir, VERSION)
+    assert len(cache) == 1
+    sha, cached_record = cache.get(source)
+    assert sha == SHA
+    assert np.array_equal(cached_record.signal, record.signal)
+    assert cached_record.timestamp == record.timestamp
+    assert cached_record.signame == record.signame
+    sha, cached_record = cache.get(source, keep_signal=False)
+    assert sha == SHA and cached_record.signal is None
+
+
+def test_version_change_invalidates(cache_dir, source):
+    fill_cache(cache_dir, source)
+    cache = SignalDiskCache(cache_dir, "2-mV-cardio")
+    assert len(cache) == 0
+    assert cache.get(source) is None
+    assert not any(file_name.endswith(".npy") for file_name in os.listdir(cache_dir))
+
+
+def test_corrupted_manifest_invalidates(cache_dir, source):
+    fill_cache(cache_dir, source)
+    with open(os.path.join(cache_dir, SignalDiskCache.MANIFEST_NAME), "w") as f:
+        f.write("{")
+    assert len(SignalDiskCache(cache_dir, VERSION)) == 0
+
+
+def test_size_change_is_missed(tmp_path, cache_dir, source):
+    fill_cache(cache_dir, source)
+    mtime = os.path.getmtime(source)
+    make_source(tmp_path, content="changed ecg")
+    os.utime(source, (mtime, mtime))
+    assert SignalDiskCache(cache_dir, VERSION).get(source) is None
+
+
+def test_mtime_change_is_missed(cache_dir, source):
+    fill_cache(cache_dir, source)
+    mtime = os.path.getmtime(source)
+    os.utime(source, (mtime + 10, mtime + 10))
+    assert SignalDiskCache(cache_dir, VERSION).get(source) is None
+
+
+def test_missing_file_is_missed(cache_dir, source):
+    fill_cache(cache_dir, source)
+    os.remove(source)
+    assert SignalDiskCache(cache_dir, VERSION).get(source) is None
+
+
+def test_missing_signal_is_missed(cache_dir, source):
+    fill_cache(cache_dir, source)
+    os.remove(os.path.join(cache_dir, SHA + ".npy"))
+    cache = SignalDiskCache(cache_dir, VERSION)
+    assert cache.get(source) is None
+    assert cache.get(source, keep_signal=False) is None
+
+
+def test_shared_signal_is_kept_until_last_remove(tmp_path, cache_dir, source):
+    copy = make_source(tmp_path, file_name="2.xml")
+    cache = SignalDiskCache(cache_dir, VERSION)
+    cache.put(source, SHA, make_record(source))
+    cache.put(copy, SHA, make_record(copy))
+    cache.remove("1.xml")
+    assert cache.get(copy) is not None
+    cache.remove("2.xml")
+    assert len(cache) == 0
+    assert cache.load_signal(SHA) is None
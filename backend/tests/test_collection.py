@@ -0,0 +1,178 @@
+import os
+import sys
+import random
+from bisect import insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.collection import EcgCollection
+from api.record import EcgRecord
+
+LABELS = ["Нормальный ритм", "Другая патология", "ЭКГ при ишемической болезни сердца/Некроз"]
+
+
+def get_sha(i):
+    return "{:064x}".format(i)
+
+
+def make_record(i, file_name=None, annotation=()):
+    file_name = "{}.xml".format(i) if file_name is None else file_name
+    return EcgRecord(file_name, 0, 500, ["mV"], ["I"], datetime(2018, 1, 1) + timedelta(seconds=i),
+                     annotation=tuple(annotation))
+
+
+def check_consistency(collection):
+    order = []
+    annotated_order = []
+    unannotated_order = []
+    label_order = defaultdict(list)
+    label_shas = defaultdict(set)
+    file_names = {}
+    for sha, record in collection.items():
+        key = (record.timestamp, sha)
+        insort(order, key)
+        insort(annotated_order if record.annotation else unannotated_order, key)
+        for label in set(record.annotation):
+            insort(label_order[label], key)
+            label_shas[label].add(sha)
+        assert record.file_name not in file_names
+        file_names[record.file_name] = sha
+    assert collection.file_names == file_names
+    assert collection.order == order
+    assert collection.annotated_order == annotated_order
+    assert collection.unannotated_order == unannotated_order
+    assert dict(collection.label_order) == dict(label_order)
+    assert dict(collection.label_shas) == dict(label_shas)
+
+
+@pytest.fixture
+def collection():
+    collection = EcgCollection()
+    for i in range(10):
+        collection.add(get_sha(i), make_record(i))
+    return collection
+
+
+def test_add(collection):
+    check_consistency(collection)
+    assert collection.get_ordered() == [get_sha(i) for i in reversed(range(10))]
+    assert list(collection.pop_changes().items()) == [(get_sha(i), "added") for i in range(10)]
+
+
+def test_add_existing_sha(collection):
+    collection.pop_changes()
+    collection.add(get_sha(3), make_record(3, file_name="other.xml"))
+    check_consistency(collection)
+    assert collection.get_sha("3.xml") is None
+    assert collection.get_sha("other.xml") == get_sha(3)
+    assert len(collection) == 10
+    assert collection.pop_changes() == {}
+
+
+def test_remove(collection):
+    collection.pop_changes()
+    sha, record = collection.remove_by_file_name("4.xml")
+    check_consistency(collection)
+    assert sha == get_sha(4) and record.file_name == "4.xml"
+    assert sha not in collection
+    assert collection.remove_by_file_name("4.xml") == (None, None)
+    collection.add(sha, record)
+    check_consistency(collection)
+    assert collection.pop_changes() == {sha: "changed"}
+
+
+def test_remove_added(collection):
+    collection.pop_changes()
+    collection.add(get_sha(10), make_record(10))
+    collection.remove(get_sha(10))
+    check_consistency(collection)
+    assert collection.pop_changes() == {}
+
+
+def test_set_annotation(collection):
+    collection.pop_changes()
+    collection.set_annotation(get_sha(2), LABELS[:2])
+    collection.set_annotation(get_sha(5), LABELS[1:])
+    check_consistency(collection)
+    assert collection.query(labels=[LABELS[1]]) == ([get_sha(5), get_sha(2)], 2)
+    assert collection.query(labels=LABELS[:2]) == ([get_sha(2)], 1)
+    assert collection.query(is_annotated=True)[1] == 2
+    assert set(collection.pop_changes()) == {get_sha(2), get_sha(5)}
+
+    collection.set_annotation(get_sha(2), LABELS[:1])
+    check_consistency(collection)
+    assert collection.pop_changes() == {}
+
+    collection.set_annotation(get_sha(2), [])
+    collection.set_annotation(get_sha(5), [])
+    check_consistency(collection)
+    assert collection.label_order == {} and collection.label_shas == {}
+    assert collection.pop_changes() == {get_sha(2): "changed", get_sha(5): "changed"}
+
+
+def test_set_annotations(collection):
+    collection.set_annotation(get_sha(4), LABELS[:1])
+    collection.pop_changes()
+    collection.set_annotations({get_sha(2): LABELS[:2], get_sha(4): [], get_sha(5): LABELS[1:], get_sha(6): []})
+    check_consistency(collection)
+    assert collection.query(labels=[LABELS[1]]) == ([get_sha(5), get_sha(2)], 2)
+    assert collection.get_ordered() == [get_sha(i) for i in reversed(range(10))]
+    assert collection.pop_changes() == {get_sha(2): "changed", get_sha(4): "changed", get_sha(5): "changed"}
+
+
+def test_rename(collection):
+    collection.set_annotation(get_sha(1), LABELS[:1])
+    collection.pop_changes()
+    assert collection.rename("1.xml", "renamed.xml") == get_sha(1)
+    check_consistency(collection)
+    assert collection.get_sha("1.xml") is None
+    assert collection.get_by_file_name("renamed.xml").annotation == tuple(LABELS[:1])
+    assert collection.rename("missing.xml", "other.xml") is None
+    assert collection.pop_changes() == {}
+
+
+def test_rename_onto_existing_name(collection):
+    collection.set_annotation(get_sha(7), LABELS[:1])
+    collection.pop_changes()
+    assert collection.rename("3.xml", "7.xml") == get_sha(3)
+    check_consistency(collection)
+    assert get_sha(7) not in collection
+    assert collection.get_sha("7.xml") == get_sha(3)
+    assert collection.get_sha("3.xml") is None
+    assert len(collection) == 9
+    assert collection.query(is_annotated=True) == ([], 0)
+    assert collection.pop_changes() == {get_sha(7): "removed"}
+
+
+def test_rename_onto_itself(collection):
+    assert collection.rename("3.xml", "3.xml") == get_sha(3)
+    check_consistency(collection)
+    assert len(collection) == 10
+
+
+def test_churn():
+    rng = random.Random(42)
+    collection = EcgCollection()
+    n_records = 100000
+    for i in range(n_records):
+        collection.add(get_sha(i), make_record(i))
+    next_id = n_records
+    for _ in range(5000):
+        file_name = "{}.xml".format(rng.randrange(next_id))
+        sha = collection.get_sha(file_name)
+        event = rng.choice(["add", "remove", "rename", "replace", "annotate"])
+        if event == "add" or sha is None:
+            collection.add(get_sha(next_id), make_record(next_id))
+        elif event == "remove":
+            collection.remove_by_file_name(file_name)
+        elif event == "rename":
+            collection.rename(file_name, "{}.xml".format(next_id))
+        elif event == "replace":
+            collection.rename(file_name, rng.choice(list(collection.file_names)))
+        else:
+            collection.set_annotation(sha, rng.sample(LABELS, rng.randrange(len(LABELS) + 1)))
+        next_id += 1
+    check_consistency(collection)
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.rwlock import RWLock
+
+TIMEOUT = 5
+
+
+def run_in_thread(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def try_acquire(acquire, release):
+    acquired = threading.Event()
+
+    def target():
+        acquire()
+        acquired.set()
+        release()
+
+    thread = run_in_thread(target)
+    return acquired, thread
+
+
+def test_reentrant_read():
+    lock = RWLock()
+    with lock.read_lock():
+        with lock.read_lock():
+            assert lock.readers == {threading.get_ident(): 2}
+        acquired, thread = try_acquire(lock.acquire_write, lock.release_write)
+        assert not acquired.wait(0.1)
+    thread.join(TIMEOUT)
+    assert acquired.is_set()
+    assert lock.readers == {} and lock.writer is None
+
+
+def test_reentrant_write():
+    lock = RWLock()
+    with lock.write_lock():
+        with lock.write_lock():
+            assert lock.writer_count == 2
+        with lock.read_lock():
+            pass
+        acquired, thread = try_acquire(lock.acquire_read, lock.release_read)
+        assert not acquired.wait(0.1)
+    thread.join(TIMEOUT)
+    assert acquired.is_set()
+    assert lock.writer is None and lock.writer_count == 0
+
+
+def test_upgrade_is_rejected():
+    lock = RWLock()
+    with lock.read_lock():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    with lock.write_lock():
+        pass
+
+
+def test_concurrent_readers():
+    lock = RWLock()
+    with lock.read_lock():
+        acquired, thread = try_acquire(lock.acquire_read, lock.release_read)
+        assert acquired.wait(TIMEOUT)
+    thread.join(TIMEOUT)
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = RWLock()
+    order = []
+    lock.acquire_read()
+    writer = run_in_thread(lambda: (lock.acquire_write(), order.append("write"), lock.release_write()))
+    while not lock.n_waiting_writers:
+        time.sleep(0.01)
+    reader = run_in_thread(lambda: (lock.acquire_read(), order.append("read"), lock.release_read()))
+    reader.join(0.1)
+    assert order == []
+    lock.release_read()
+    writer.join(TIMEOUT)
+    reader.join(TIMEOUT)
+    assert order == ["write", "read"]
+
+
+def test_on_wait():
+    waits = []
+    lock = RWLock(on_wait=lambda mode, wait_time: waits.append(mode))
+    with lock.read_lock():
+        with lock.read_lock():
+            pass
+    with lock.write_lock():
+        with lock.write_lock():
+            pass
+    assert waits == ["read", "write"]
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.storage import AnnotationStore
+
+ANNOTATION_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config",
+                                    "annotation_list.json")
+LABELS = ["Нормальный ритм", "Другая патология", "ЭКГ при ишемической болезни сердца/Некроз"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AnnotationStore(str(tmp_path / "annotation.db"))
+    yield store
+    store.close()
+
+
+def test_set_annotation_counts(store):
+    store.set_annotation("1.xml", [], LABELS[:2])
+    store.set_annotation("2.xml", [], LABELS[1:])
+    store.set_annotation("1.xml", LABELS[:2], LABELS[:1])
+    assert store.load_annotations() == {"1.xml": LABELS[:1], "2.xml": LABELS[1:]}
+    assert store.load_counts() == {LABELS[0]: 1, LABELS[1]: 1, LABELS[2]: 1}
+    store.remove_annotation("2.xml", LABELS[1:])
+    assert store.load_annotations() == {"1.xml": LABELS[:1]}
+    assert store.load_counts() == {LABELS[0]: 1, LABELS[1]: 0, LABELS[2]: 0}
+
+
+def test_rename_and_remove(store):
+    store.set_annotation("1.xml", [], LABELS[:1])
+    store.set_annotation("2.xml", [], LABELS[1:2])
+    store.rename("1.xml", "3.xml")
+    assert store.load_annotations() == {"3.xml": LABELS[:1], "2.xml": LABELS[1:2]}
+    store.remove_annotations(["2.xml", "3.xml"])
+    assert store.load_annotations() == {}
+    assert store.load_counts() == {LABELS[0]: 1, LABELS[1]: 1}
+
+
+def test_import_sets_version(tmp_path):
+    path = str(tmp_path / "annotation.db")
+    store = AnnotationStore(path)
+    assert store.is_new
+    store.close()
+    store = AnnotationStore(path)
+    assert store.is_new
+    store.import_annotations({"1.xml": LABELS[:2]}, {LABELS[0]: 3})
+    assert not store.is_new
+    store.close()
+    store = AnnotationStore(path)
+    assert not store.is_new
+    assert store.load_annotations() == {"1.xml": LABELS[:2]}
+    assert store.load_counts() == {LABELS[0]: 3}
+    store.close()
+
+
+def test_failed_import_is_retried(tmp_path):
+    path = str(tmp_path / "annotation.db")
+    store = AnnotationStore(path)
+    with pytest.raises(TypeError):
+        store.import_annotations({"1.xml": LABELS[:1], "2.xml": object()}, {LABELS[0]: 1})
+    store.close()
+    store = AnnotationStore(path)
+    assert store.is_new
+    assert store.load_annotations() == {} and store.load_counts() == {}
+    store.close()
+
+
+def test_unsupported_version(tmp_path):
+    path = str(tmp_path / "annotation.db")
+    store = AnnotationStore(path)
+    store.connection.execute("PRAGMA user_version={}".format(AnnotationStore.SCHEMA_VERSION + 1))
+    store.close()
+    with pytest.raises(ValueError):
+        AnnotationStore(path)
+
+
+def make_handler(tmp_path, file_names):
+    from api.handler import EcgDirectoryHandler
+    watch_dir = tmp_path / "watch"
+    watch_dir.mkdir(exist_ok=True)
+    for file_name in file_names:
+        (watch_dir / file_name).write_text("ecg")
+    return EcgDirectoryHandler(str(watch_dir), str(tmp_path / "dump"), ANNOTATION_LIST_PATH,
+                               str(watch_dir / "annotation_count.json"), str(watch_dir / "annotation.feather"),
+                               str(tmp_path / "annotation.db"), is_lazy_loading_enabled=True,
+                               is_native_reader_enabled=True, signal_cache_size=2**20, n_workers=1, cache_dir=None,
+                               event_coalescing_window=0, prefetch_size=0)
+
+
+def get_counts(handler):
+    return dict(zip(handler.annotation_matrix.labels, handler.annotation_matrix.counts.tolist()))
+
+
+def test_legacy_import(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    (tmp_path / "watch").mkdir()
+    with open(str(tmp_path / "watch" / "annotation_count.json"), "w", encoding="utf-8") as json_data:
+        json.dump({LABELS[0]: 5, LABELS[2]: 1}, json_data)
+    df = pd.DataFrame({"index": ["1.xml", "2.xml"], LABELS[0]: np.array([1, 0], dtype=np.int64),
+                       LABELS[1]: np.array([1, 1], dtype=np.int64)})
+    df.to_feather(str(tmp_path / "watch" / "annotation.feather"))
+
+    handler = make_handler(tmp_path, ["1.xml", "2.xml"])
+    assert handler.annotation_store.load_annotations() == {"1.xml": LABELS[:2], "2.xml": LABELS[1:2]}
+    assert handler.annotation_store.load_counts() == {LABELS[0]: 6, LABELS[1]: 2, LABELS[2]: 1}
+    assert handler.pending_annotations == {"1.xml": LABELS[:2], "2.xml": LABELS[1:2]}
+    counts = get_counts(handler)
+    assert (counts[LABELS[0]], counts[LABELS[1]], counts[LABELS[2]]) == (6, 2, 1)
+    handler.annotation_store.set_annotation("2.xml", LABELS[1:2], [])
+    handler.annotation_store.close()
+
+    handler = make_handler(tmp_path, ["1.xml", "2.xml"])
+    assert handler.annotation_store.load_annotations() == {"1.xml": LABELS[:2]}
+    assert get_counts(handler)[LABELS[1]] == 1
+    handler.annotation_store.close()
+
+
+def test_legacy_count_import(tmp_path):
+    (tmp_path / "watch").mkdir()
+    with open(str(tmp_path / "watch" / "annotation_count.json"), "w", encoding="utf-8") as json_data:
+        json.dump({LABELS[0]: 2, "Unknown": 4}, json_data)
+    handler = make_handler(tmp_path, [])
+    assert handler.annotation_store.load_counts() == {LABELS[0]: 2, "Unknown": 4}
+    assert get_counts(handler)[LABELS[0]] == 2
+    assert not handler.annotation_store.is_new
+    handler.annotation_store.close()
@@ -15,19 +15,35 @@ const ServerEvents = keyMirror({
 
 const ECG_Requests = keyMirror({
   ECG_GET_LIST: null,
+  ECG_QUERY: null,
+  ECG_GET_NEXT_UNANNOTATED: null,
   ECG_GET_ITEM_DATA: null,
+  ECG_GET_ITEM_WINDOW: null,
   ECG_SET_ANNOTATION: null,
   ECG_DUMP_SIGNALS: null,
+  ECG_EXPORT_ANNOTATION: null,
+  ECG_EXPORT_DATASET: null,
   ECG_GET_ANNOTATION_LIST: null,
   ECG_GET_COMMON_ANNOTATION_LIST: null,
+  ECG_GET_METRICS: null,
   SHUTDOWN: null
 })
 
 const ECG_Responses = keyMirror({
   ECG_GOT_LIST: null,
+  ECG_GOT_LIST_PAGE: null,
+  ECG_LIST_PATCH: null,
+  ECG_DUMP_PROGRESS: null,
+  ECG_EXPORT_PROGRESS: null,
+  ECG_GOT_QUERY: null,
+  ECG_GOT_NEXT_UNANNOTATED: null,
   ECG_GOT_ITEM_DATA: null,
+  ECG_ITEM_DATA_CANCELLED: null,
+  ECG_GOT_ITEM_WINDOW: null,
+  ECG_ANNOTATION_CHANGED: null,
   ECG_GOT_ANNOTATION_LIST: null,
-  ECG_GOT_COMMON_ANNOTATION_LIST: null
+  ECG_GOT_COMMON_ANNOTATION_LIST: null,
+  ECG_GOT_METRICS: null
 })
 
 const ECG_API = Object.assign({}, ECG_Responses, ECG_Requests)
@@ -1,6 +1,6 @@
 import { observable, autorun, action, extendObservable } from 'mobx'
 
-import { API_Events } from './const'
+import { API_Events, ServerEvents } from './const'
 
 const itemTemplate = {
   annotation: [],
@@ -12,6 +12,7 @@ const itemTemplate = {
   signame: null,
   timestamp: null,
   units: null,
+  window: null,
   waitingData: false
 }
 
@@ -20,10 +21,33 @@ const annotationTemplate = {
   annotations: []
 }
 
+const SIGNAL_FORMAT = 'float32'
+
+function decodeSignal (buffer, signalMeta) {
+  if (!(buffer instanceof ArrayBuffer)) {
+    buffer = buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength)
+  }
+  const [nLeads, nSamples] = signalMeta.shape
+  let values = null
+  if (signalMeta.dtype === '<i2') {
+    values = Float32Array.from(new Int16Array(buffer), x => x * signalMeta.scale)
+  } else {
+    values = new Float32Array(buffer)
+  }
+  return [...Array(nLeads).keys()].map(i => values.subarray(i * nSamples, (i + 1) * nSamples))
+}
+
 export default class EcgStore {
   server = null
-  @observable ready = true
+  listVersion = null
+  waitingList = false
+  @observable ready = false
   @observable waitingZip = false
+  @observable dumpProgress = null
+  @observable waitingDataset = false
+  @observable exportProgress = null
+  @observable queryResult = null
+  @observable nextUnannotatedId = null
   @observable readyEcgList = false
   @observable readyAnnotationList = false
   @observable annotationList = new Map()
@@ -33,20 +57,42 @@ export default class EcgStore {
   constructor (server) {
     this.server = server
     autorun(() => this.onConnect())
+    this.server.subscribe(ServerEvents.SERVER_READY, this.onServerReady.bind(this))
     this.server.subscribe(API_Events.ECG_GOT_LIST, this.onGotList.bind(this))
+    this.server.subscribe(API_Events.ECG_LIST_PATCH, this.onListPatch.bind(this))
     this.server.subscribe(API_Events.ECG_GOT_ANNOTATION_LIST, this.onGotAnnotationList.bind(this))
     this.server.subscribe(API_Events.ECG_GOT_COMMON_ANNOTATION_LIST, this.onGotCommonAnnotationList.bind(this))
     this.server.subscribe(API_Events.ECG_GOT_ITEM_DATA, this.onGotItemData.bind(this))
+    this.server.subscribe(API_Events.ECG_ITEM_DATA_CANCELLED, this.onItemDataCancelled.bind(this))
+    this.server.subscribe(API_Events.ECG_GOT_ITEM_WINDOW, this.onGotItemWindow.bind(this))
+    this.server.subscribe(API_Events.ECG_ANNOTATION_CHANGED, this.onAnnotationChanged.bind(this))
+    this.server.subscribe(API_Events.ECG_DUMP_PROGRESS, this.onDumpProgress.bind(this))
+    this.server.subscribe(API_Events.ECG_EXPORT_PROGRESS, this.onExportProgress.bind(this))
+    this.server.subscribe(API_Events.ECG_GOT_QUERY, this.onGotQuery.bind(this))
+    this.server.subscribe(API_Events.ECG_GOT_NEXT_UNANNOTATED, this.onGotNextUnannotated.bind(this))
   }
 
   onConnect () {
+    if (!this.server.ready) {
+      this.listVersion = null
+    }
     if ((this.items.size === 0) & this.server.ready) {
-      this.server.send(API_Events.ECG_GET_LIST)
+      this.requestList()
       this.server.send(API_Events.ECG_GET_ANNOTATION_LIST)
       this.server.send(API_Events.ECG_GET_COMMON_ANNOTATION_LIST)
     }
   }
 
+  requestList () {
+    this.waitingList = true
+    this.server.send(API_Events.ECG_GET_LIST)
+  }
+
+  @action
+  onServerReady (data, meta) {
+    this.ready = data.isReady
+  }
+
   @action
   onGotList (data, meta) {
     var newIds = []
@@ -61,12 +107,68 @@ export default class EcgStore {
         this.items.delete(id)
       }
     };
+    this.listVersion = meta.listVersion
+    this.waitingList = false
     this.readyEcgList = true
     if (this.waitingZip) {
       this.waitingZip = false
     }
   }
 
+  @action
+  onListPatch (data, meta) {
+    if (this.waitingList || (this.listVersion !== null && data.version <= this.listVersion)) {
+      return
+    }
+    if (this.listVersion === null || data.version !== this.listVersion + 1) {
+      this.requestList()
+      return
+    }
+    this.listVersion = data.version
+    for (let item of data.added) {
+      if (!this.items.has(item.id)) {
+        this.items.set(item.id, Object.assign({}, itemTemplate, item))
+      }
+    };
+    for (let id of data.removed) {
+      this.items.delete(id)
+    };
+    for (let item of data.changed) {
+      const existingItem = this.items.get(item.id)
+      if (existingItem !== undefined) {
+        Object.assign(existingItem, item)
+      } else {
+        this.items.set(item.id, Object.assign({}, itemTemplate, item))
+      }
+    };
+  }
+
+  @action
+  onDumpProgress (data, meta) {
+    this.dumpProgress = data
+    if (data.isFinished) {
+      this.waitingZip = false
+    }
+  }
+
+  @action
+  onExportProgress (data, meta) {
+    this.exportProgress = data
+    if (data.isFinished) {
+      this.waitingDataset = false
+    }
+  }
+
+  @action
+  onGotQuery (data, meta) {
+    this.queryResult = data
+  }
+
+  @action
+  onGotNextUnannotated (data, meta) {
+    this.nextUnannotatedId = data.nextId
+  }
+
   @action
   onGotAnnotationList (data, meta) {
     data.map((item) => this.annotationList.set(item.id, Object.assign({}, annotationTemplate, item)))
@@ -84,6 +186,10 @@ export default class EcgStore {
   @action
   onGotItemData (data, meta) {
     const item = this.items.get(data.id)
+    if (data.signalMeta !== undefined) {
+      data.signal = decodeSignal(data.signal, data.signalMeta)
+      delete data.signalMeta
+    }
     extendObservable(item, data)
     if (data.annotation.length > 0) {
       item.isAnnotated = true
@@ -91,16 +197,53 @@ export default class EcgStore {
     item.waitingData = false
   }
 
+  @action
+  onItemDataCancelled (data, meta) {
+    const item = this.items.get(data.id)
+    if (item !== undefined) {
+      item.waitingData = false
+    }
+  }
+
+  @action
+  onGotItemWindow (data, meta) {
+    const item = this.items.get(data.id)
+    if (item !== undefined) {
+      item.window = data
+    }
+  }
+
+  @action
+  onAnnotationChanged (data, meta) {
+    const item = this.items.get(data.id)
+    if (item !== undefined) {
+      item.annotation = data.annotation
+      item.isAnnotated = data.annotation.length > 0
+    }
+  }
+
   getItemData (id) {
     const item = this.items.get(id)
     if (item !== undefined) {
       if (!item.waitingData) {
         item.waitingData = true
-        this.server.send(API_Events.ECG_GET_ITEM_DATA, {id: id})
+        this.server.send(API_Events.ECG_GET_ITEM_DATA, {id: id, format: SIGNAL_FORMAT})
       }
     }
   }
 
+  getItemWindow (id, width, start, end, leads) {
+    this.server.send(API_Events.ECG_GET_ITEM_WINDOW, {id: id, width: width, start: start, end: end, leads: leads})
+  }
+
+  query (filters, offset, limit) {
+    this.server.send(API_Events.ECG_QUERY, Object.assign({offset: offset, limit: limit}, filters))
+  }
+
+  getNextUnannotated (id) {
+    this.server.send(API_Events.ECG_GET_NEXT_UNANNOTATED, {id: id})
+  }
+
   setAnnotation (id, annotation) {
     this.server.send(API_Events.ECG_SET_ANNOTATION, {id: id, annotation: annotation})
   }
@@ -110,6 +253,11 @@ export default class EcgStore {
     this.server.send(API_Events.ECG_DUMP_SIGNALS)
   }
 
+  exportDataset () {
+    this.waitingDataset = true
+    this.server.send(API_Events.ECG_EXPORT_DATASET)
+  }
+
   shutdown () {
     this.server.send(API_Events.SHUTDOWN)
   }
@@ -2,7 +2,7 @@ import socket from 'socket.io-client'
 import { observable } from 'mobx'
 import EventEmitter from 'eventemitter3'
 
-import { API_Responses, SocketIOEvents } from './const'
+import { API_Responses, ServerEvents, SocketIOEvents } from './const'
 
 
 export default class Server extends EventEmitter {
@@ -22,6 +22,10 @@ export default class Server extends EventEmitter {
             this.server.on(api_key, this.onCommand.bind(this, api_key))
         }
 
+        for(const server_key in ServerEvents){
+            this.server.on(server_key, this.onCommand.bind(this, server_key))
+        }
+
         for(const state in SocketIOEvents){
             this.server.on(state, this.onStateChange.bind(this, state))
         }